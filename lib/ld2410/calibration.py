@@ -0,0 +1,119 @@
+import asyncio
+import json
+import math
+from array import array
+
+
+class GateCalibration:
+    """Collect per-gate energy statistics from engineering-mode frames.
+
+    Sums, sums of squares and peaks for the 9 moving and 9 stationary gates
+    are kept in fixed integer arrays (moving gates first), so recording for
+    minutes costs no more memory than recording for a second.
+    """
+    def __init__(self, radar, sigma=3, margin=10):
+        self.radar = radar
+        self.sigma = sigma
+        self.margin = margin
+        self.frames = 0
+        self._sum = array('I', [0] * 18)
+        self._sumsq = array('I', [0] * 18)
+        self._peak = array('B', [0] * 18)
+
+    def _on_frame(self, radar):
+        moving = radar.gate_moving_energy
+        stationary = radar.gate_stationary_energy
+        total = self._sum
+        sumsq = self._sumsq
+        peak = self._peak
+        for i in range(9):
+            m = moving[i]
+            s = stationary[i]
+            total[i] += m
+            total[9 + i] += s
+            sumsq[i] += m * m
+            sumsq[9 + i] += s * s
+            if m > peak[i]:
+                peak[i] = m
+            if s > peak[9 + i]:
+                peak[9 + i] = s
+        self.frames += 1
+
+    async def record(self, duration_s):
+        """Record frames for duration_s seconds; returns the number recorded."""
+        radar = self.radar
+        previous = radar.on_engineering
+
+        def hook(r):
+            self._on_frame(r)
+            if previous is not None:
+                previous(r)
+
+        radar.on_engineering = hook
+        try:
+            await asyncio.sleep(duration_s)
+        finally:
+            radar.on_engineering = previous
+        return self.frames
+
+    def thresholds(self):
+        """Return (moving, stationary) thresholds: max(mean + sigma*std, peak) + margin."""
+        n = self.frames
+        result = []
+        for i in range(18):
+            mean = self._sum[i] / n
+            std = math.sqrt(max(self._sumsq[i] / n - mean * mean, 0))
+            noise = max(mean + self.sigma * std, self._peak[i])
+            result.append(min(100, int(noise + 0.5) + self.margin))
+        return result[:9], result[9:]
+
+    def profile(self):
+        """Thresholds as an apply_profile() profile.
+
+        Stationary gates 0 and 1 are None: the radar cannot set them, so
+        apply_profile() leaves them as they are.
+        """
+        moving, stationary = self.thresholds()
+        stationary[0] = stationary[1] = None
+        return {"moving_sensitivity": moving, "stationary_sensitivity": stationary}
+
+
+async def calibrate(radar, duration_s=30, sigma=3, margin=10, min_frames=50, engineering_mode=False):
+    """Learn thresholds from an empty room and apply them to `radar`.
+
+    Engineering mode is enabled for the recording and left as requested by
+    `engineering_mode` afterwards. Returns the applied profile, or None if too
+    few frames were recorded or the radar rejected the profile.
+    """
+    if not radar.engineering_mode and not await radar.apply_profile({"engineering_mode": True}):
+        print("LD2410 calibration: could not enable engineering mode")
+        return None
+    calibration = GateCalibration(radar, sigma, margin)
+    await calibration.record(duration_s)
+    profile = calibration.profile() if calibration.frames >= min_frames else None
+    if profile is None:
+        print(f"LD2410 calibration: only {calibration.frames} frames recorded")
+        await radar.apply_profile({"engineering_mode": engineering_mode})
+        return None
+    if not await radar.apply_profile(dict(profile, engineering_mode=engineering_mode)):
+        print("LD2410 calibration: radar rejected the thresholds")
+        return None
+    return profile
+
+
+def save_profile(path, profile):
+    try:
+        with open(path, 'w') as f:
+            json.dump(profile, f)
+        return True
+    except OSError as e:
+        print(f"Failed to save LD2410 profile: {e}")
+        return False
+
+
+def load_profile(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
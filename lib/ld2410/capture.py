@@ -0,0 +1,75 @@
+import struct
+from ticks import ticks_ms
+
+# Capture file layout: CAPTURE_MAGIC, then one record per UART read:
+#   ticks_ms (u32), length (u16), raw bytes
+CAPTURE_MAGIC = b'LDC1'
+RECORD_HEADER = '<IH'
+RECORD_HEADER_SIZE = 6
+
+
+class UARTCapture:
+    """Record the raw UART bytes seen by LD2410.update() to a file on flash.
+
+    Records are collected in a RAM buffer and written out only when it fills
+    up (or on flush/close), so flash sees a few large writes instead of one
+    per UART read. Recording stops once max_bytes have been written.
+    """
+    def __init__(self, path, buf_size=2048, max_bytes=256 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._buf = bytearray(buf_size)
+        self._pos = 0
+        self.written = len(CAPTURE_MAGIC)
+        self.full = False
+        self._file = open(path, 'wb')
+        self._file.write(CAPTURE_MAGIC)
+
+    def record(self, data):
+        if self.full:
+            return
+        n = len(data)
+        size = RECORD_HEADER_SIZE + n
+        if self.written + self._pos + size > self.max_bytes:
+            self.full = True
+            self.flush()
+            return
+        if self._pos + size > len(self._buf):
+            self.flush()
+            if size > len(self._buf):
+                self._file.write(struct.pack(RECORD_HEADER, ticks_ms() & 0xffffffff, n))
+                self._file.write(data)
+                self.written += size
+                return
+        struct.pack_into(RECORD_HEADER, self._buf, self._pos, ticks_ms() & 0xffffffff, n)
+        self._buf[self._pos + RECORD_HEADER_SIZE:self._pos + size] = data
+        self._pos += size
+
+    def flush(self):
+        if self._pos:
+            self._file.write(memoryview(self._buf)[:self._pos])
+            self.written += self._pos
+            self._pos = 0
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+
+def read_capture(path):
+    """Yield (ticks_ms, bytes) records from a capture file."""
+    with open(path, 'rb') as f:
+        if f.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            raise ValueError("Not an LD2410 capture file: %s" % path)
+        while True:
+            header = f.read(RECORD_HEADER_SIZE)
+            if len(header) < RECORD_HEADER_SIZE:
+                return
+            t, n = struct.unpack(RECORD_HEADER, header)
+            data = f.read(n)
+            if len(data) < n:
+                return
+            yield t, data
@@ -1,7 +1,6 @@
+import asyncio
 import struct
-import time
-from micropython import const
-import binascii
+from ticks import const, ticks_ms, ticks_us, ticks_diff
 
 CMD_HEAD = const(b'\xfd\xfc\xfb\xfa')
 CMD_TAIL = const(b'\x04\x03\x02\x01')
@@ -31,10 +30,64 @@ BAUDRATE_230400 = const(6)
 BAUDRATE_256000 = const(7)
 BAUDRATE_460800 = const(8)
 
+_RING_SIZE = const(256)      # must be a power of two
+_RING_MASK = const(255)
+_MAX_DATA_LEN = const(64)    # longest payload the radar sends is 35 bytes
+_FRAME_OVERHEAD = const(10)  # head(4) + length(2) + tail(4)
+# Gates 0 and 1 have no stationary detection: their sensitivity cannot be set and reads back as 0
+_FIXED_STATIONARY_GATES = const(2)
+
+# Header-search state machine
+_ST_HEAD = const(0)   # looking for CMD_HEAD / REPORT_HEAD at the read index
+_ST_FRAME = const(1)  # header matched, waiting for length + body + tail
+
+def parse_parameters(data):
+    """Decode the READ_PARAMETER ACK payload returned by get_parameter().
+
+    Returns a dict with the same keys accepted by LD2410.apply_profile(),
+    or None if the payload is not a parameter readback.
+    """
+    if not data or len(data) < 26 or data[2] != 0xaa:
+        return None
+    return {
+        "max_moving_gate": data[4],
+        "max_stationary_gate": data[5],
+        "moving_sensitivity": list(data[6:15]),
+        "stationary_sensitivity": list(data[15:24]),
+        "inactivity_time": data[24] | (data[25] << 8),
+    }
+
 class LD2410:
     def __init__(self, uart):
         self.uart = uart
-        self.buf = b''
+
+        # Receive ring buffer. Bytes from the UART land here and complete frames
+        # are decoded in place, so the steady state does not allocate per byte.
+        self._ring = bytearray(_RING_SIZE)
+        self._ring_mv = memoryview(self._ring)
+        self._rd = 0
+        self._count = 0
+        self._state = _ST_HEAD
+        self._is_cmd = False
+        # Scratch buffer used only when a frame wraps around the end of the ring
+        self._frame = bytearray(_MAX_DATA_LEN + _FRAME_OVERHEAD)
+
+        # Bytes read and frames decoded by the last update() call
+        self.last_bytes = 0
+        self.last_frames = 0
+        # Parser health counters, see get_stats()
+        self.frames_ok = 0
+        self.bad_header = 0
+        self.bad_tail = 0
+        self.truncated = 0
+        self.resyncs = 0
+        self.bytes_skipped = 0
+        self.acks = 0
+        self.ack_timeouts = 0
+        self.max_update_us = 0
+        self._in_sync = True
+        # Optional UARTCapture (ld2410.capture) recording every chunk read
+        self.capture = None
 
         self.target_state = 0
         # 0: No target detected; 1: Stationary target detected; 2: Moving target detected; 3: Both stationary and moving
@@ -48,90 +101,389 @@ class LD2410:
         self.max_stationary_gate = 0
         self.gate_moving_energy = [0] * 9
         self.gate_stationary_energy = [0] * 9
+        # Called with the driver after every engineering-mode frame
+        self.on_engineering = None
 
         self.ack_cmd = 0
         self.ack_data = b''
+        # ACK bookkeeping for pipelined commands, see _send_pipelined()
+        self._pipeline = None
+        self._pipe_acked = 0
+        self._pipe_failed = 0
+        # Commands sent by the last apply_profile() call
+        self.profile_changes = 0
+        # True while the radar is sending engineering-mode reports
+        self.engineering_mode = False
+
+        # Debounced target state and transition callback, see set_state_filter()
+        self.presence_state = 0
+        self.on_state_change = None
+        self.debounce_ms = 0
+        self.release_ms = 0
+        self._candidate_state = -1
+        self._candidate_since = 0
+
+    def set_state_filter(self, debounce_ms=0, release_ms=0, callback=None):
+        """Configure how target_state changes are turned into transitions.
+
+        A new state must be seen for debounce_ms before it is reported, and
+        "no target" must persist for release_ms, so presence turns on quickly
+        but needs a longer quiet period to turn off (hysteresis).
+        callback(state, previous) is called from the parser on every transition.
+        """
+        self.debounce_ms = debounce_ms
+        self.release_ms = release_ms
+        if callback is not None:
+            self.on_state_change = callback
+
+    def is_presence(self):
+        return self.presence_state > 0
 
     def update(self):
-        while self.uart.any():
-            self.buf += self.uart.read(1)
-            if len(self.buf) >= 10 and (self.buf[-4:] == CMD_TAIL or self.buf[-4:] == REPORT_TAIL):
-                self._parse_buffer()
+        """Drain everything the UART holds and decode all complete frames.
 
-    def _parse_buffer(self):
-        while True:
-            if self.buf[:4] == CMD_HEAD:
-                self._parse_ack()
-            elif self.buf[:4] == REPORT_HEAD:
-                self._parse_report()
-            if len(self.buf) < 10:
+        Returns the number of frames decoded; the byte count is kept in last_bytes.
+        """
+        start = ticks_us()
+        uart = self.uart
+        nbytes = 0
+        frames = 0
+        while uart.any():
+            if self._count == _RING_SIZE:
+                frames += self._parse_ring()
+            # Read straight into the free contiguous span of the ring
+            wr = (self._rd + self._count) & _RING_MASK
+            space = min(_RING_SIZE - self._count, _RING_SIZE - wr)
+            n = uart.readinto(self._ring_mv[wr:wr + space])
+            if not n:
                 break
-            self.buf = self.buf[1:]
-
-    def _parse_ack(self):
-        data_length = self.buf[4] + (self.buf[5] << 8)
-        if len(self.buf) < 10 + data_length:
-            return
-
-        self.ack_cmd = self.buf[6] + ((self.buf[7] & 0xfe) << 8 )
-        self.ack_data = self.buf[8:8+data_length-2]
-        self.buf = self.buf[10+data_length:]
+            if self.capture is not None:
+                self.capture.record(self._ring_mv[wr:wr + n])
+            self._count += n
+            nbytes += n
+        frames += self._parse_ring()
+        self.last_bytes = nbytes
+        self.last_frames = frames
+        elapsed = ticks_diff(ticks_us(), start)
+        if elapsed > self.max_update_us:
+            self.max_update_us = elapsed
+        return frames
+
+    def get_stats(self):
+        """Return the parser health counters as a dict."""
+        return {
+            "frames_ok": self.frames_ok,
+            "bad_header": self.bad_header,
+            "bad_tail": self.bad_tail,
+            "truncated": self.truncated,
+            "resyncs": self.resyncs,
+            "bytes_skipped": self.bytes_skipped,
+            "acks": self.acks,
+            "ack_timeouts": self.ack_timeouts,
+            "max_update_us": self.max_update_us,
+        }
+
+    def reset_stats(self):
+        self.frames_ok = self.bad_header = self.bad_tail = self.truncated = 0
+        self.resyncs = self.bytes_skipped = 0
+        self.acks = self.ack_timeouts = 0
+        self.max_update_us = 0
+
+    def _skip(self, n):
+        self._rd = (self._rd + n) & _RING_MASK
+        self._count -= n
+
+    def _parse_ring(self):
+        """Decode every complete frame held in the ring buffer, return the count."""
+        ring = self._ring
+        frames = 0
+        while True:
+            rd = self._rd
+            if self._state == _ST_HEAD:
+                if self._count < 4:
+                    return frames
+                first = ring[rd]
+                if first == 0xfd:
+                    head = CMD_HEAD
+                elif first == 0xf4:
+                    head = REPORT_HEAD
+                else:
+                    self._discard()
+                    continue
+                if (ring[(rd + 1) & _RING_MASK] != head[1] or
+                        ring[(rd + 2) & _RING_MASK] != head[2] or
+                        ring[(rd + 3) & _RING_MASK] != head[3]):
+                    self._discard()
+                    continue
+                self._is_cmd = first == 0xfd
+                self._state = _ST_FRAME
+
+            if self._count < 6:
+                return frames
+            data_length = ring[(rd + 4) & _RING_MASK] | (ring[(rd + 5) & _RING_MASK] << 8)
+            if data_length > _MAX_DATA_LEN:
+                self.bad_header += 1
+                self._resync()
+                continue
+            total = data_length + _FRAME_OVERHEAD
+            if self._count < total:
+                return frames
+
+            tail = CMD_TAIL if self._is_cmd else REPORT_TAIL
+            end = rd + total - 4
+            if (ring[end & _RING_MASK] != tail[0] or
+                    ring[(end + 1) & _RING_MASK] != tail[1] or
+                    ring[(end + 2) & _RING_MASK] != tail[2] or
+                    ring[(end + 3) & _RING_MASK] != tail[3]):
+                # A new header inside the frame means this one was cut off
+                if self._header_within(rd + 4, end):
+                    self.truncated += 1
+                else:
+                    self.bad_tail += 1
+                self._resync()
+                continue
+
+            if rd + total <= _RING_SIZE:
+                buf, off = ring, rd
+            else:
+                # Frame wraps around the end of the ring: linearize it first
+                first_part = _RING_SIZE - rd
+                self._frame[0:first_part] = self._ring_mv[rd:_RING_SIZE]
+                self._frame[first_part:total] = self._ring_mv[0:total - first_part]
+                buf, off = self._frame, 0
+
+            if self._is_cmd:
+                self._parse_ack(buf, off, data_length)
+            else:
+                self._parse_report(buf, off, data_length)
+            self._skip(total)
+            self._state = _ST_HEAD
+            self._in_sync = True
+            frames += 1
+
+    def _discard(self):
+        # Drop one byte that cannot start a frame
+        if self._in_sync:
+            self._in_sync = False
+            self.resyncs += 1
+        self.bytes_skipped += 1
+        self._skip(1)
+
+    def _resync(self):
+        # Drop the first header byte and search for the next header
+        self._discard()
+        self._state = _ST_HEAD
+
+    def _header_within(self, start, end):
+        ring = self._ring
+        for i in range(start, end):
+            b = ring[i & _RING_MASK]
+            if b == 0xf4 or b == 0xfd:
+                nxt = ring[(i + 1) & _RING_MASK]
+                if (b == 0xf4 and nxt == 0xf3) or (b == 0xfd and nxt == 0xfc):
+                    return True
+        return False
 
-    def _parse_report(self):
-        data_length = self.buf[4] + (self.buf[5] << 8)
-        if len(self.buf) < 10 + data_length:
+    def _parse_ack(self, buf, off, data_length):
+        if data_length < 2:
             return
+        self.acks += 1
+        self.ack_cmd = buf[off + 6] + ((buf[off + 7] & 0xfe) << 8)
+        self.ack_data = bytes(buf[off + 8:off + 6 + data_length])
+        pipeline = self._pipeline
+        if pipeline is not None and self._pipe_acked < len(pipeline):
+            if self.ack_cmd == pipeline[self._pipe_acked]:
+                self._pipe_acked += 1
+                if self.ack_data[:2] != b'\x00\x00':
+                    self._pipe_failed += 1
+
+    def _parse_report(self, buf, off, data_length):
+        report_type = buf[off + 6]
+        if report_type == 0x01:
+            self.engineering_mode = True
+            self._parse_engineering_data(buf, off + 7, data_length - 1)
+        elif report_type == 0x02:
+            self.engineering_mode = False
+            self._parse_target_data(buf, off + 7, data_length - 1)
+
+    def _check_data(self, buf, off, length, min_length):
+        if length < min_length:
+            self.truncated += 1
+            return False
+        if buf[off] != REPORT_DATA_HEAD[0]:
+            self.bad_header += 1
+            return False
+        if buf[off + length - 2] != REPORT_DATA_TAIL[0] or buf[off + length - 1] != REPORT_DATA_TAIL[1]:
+            self.bad_tail += 1
+            return False
+        self.frames_ok += 1
+        return True
 
-        if self.buf[6] == 0x01:
-            self._parse_engineering_data(self.buf[7:7+data_length-1])
-        elif self.buf[6] == 0x02:
-            self._parse_target_data(self.buf[7:7+data_length-1])
-
-        self.buf = self.buf[10+data_length:]
-
-    def _parse_engineering_data(self, data):
-        if data[0:1] != REPORT_DATA_HEAD or data[-2:] != REPORT_DATA_TAIL:
+    def _parse_engineering_data(self, buf, off, length):
+        if not self._check_data(buf, off, length, 32):
             return
 
-        self._parse_target_data(data)
-        self.max_moving_gate = data[10]
-        self.max_stationary_gate = data[11]
-        for i in range(9):
-            self.gate_moving_energy[i] = data[12 + i]
+        self._unpack_target(buf, off)
+        self.max_moving_gate = buf[off + 10]
+        self.max_stationary_gate = buf[off + 11]
+        moving = self.gate_moving_energy
+        stationary = self.gate_stationary_energy
         for i in range(9):
-            self.gate_stationary_energy[i] = data[21 + i]
+            moving[i] = buf[off + 12 + i]
+            stationary[i] = buf[off + 21 + i]
+        if self.on_engineering is not None:
+            self.on_engineering(self)
 
-    def _parse_target_data(self, data):
-        if data[0:1] != REPORT_DATA_HEAD or data[-2:] != REPORT_DATA_TAIL:
+    def _parse_target_data(self, buf, off, length):
+        if not self._check_data(buf, off, length, 12):
             return
 
-        self.target_state = data[1]
-        self.moving_distance = data[2] + (data[3] << 8)
-        self.moving_energy = data[4]
-        self.stationary_distance = data[5] + (data[6] << 8)
-        self.stationary_energy = data[7]
-        self.detection_distance = data[8] + (data[9] << 8)
+        self._unpack_target(buf, off)
 
-    def _send_cmd(self, cmd, data):
+    def _unpack_target(self, buf, off):
+        (self.target_state, self.moving_distance, self.moving_energy,
+         self.stationary_distance, self.stationary_energy,
+         self.detection_distance) = struct.unpack_from('<BHBHBH', buf, off + 1)
+        self._filter_state(self.target_state)
+
+    def _filter_state(self, state):
+        # Evaluated per report frame; the radar reports ~10 times per second
+        if state == self.presence_state:
+            self._candidate_state = -1
+            return
+        now = ticks_ms()
+        if state != self._candidate_state:
+            self._candidate_state = state
+            self._candidate_since = now
+        hold = self.release_ms if state == 0 else self.debounce_ms
+        if ticks_diff(now, self._candidate_since) >= hold:
+            previous = self.presence_state
+            self.presence_state = state
+            self._candidate_state = -1
+            self._state_changed(state, previous)
+
+    def _state_changed(self, state, previous):
+        if self.on_state_change is not None:
+            self.on_state_change(state, previous)
+
+    def _write_cmd(self, cmd, data):
         cmd_bytes = struct.pack('<H', cmd)
         data_length = struct.pack('<H', len(cmd_bytes) + len(data))
         self.uart.write(CMD_HEAD + data_length + cmd_bytes + data + CMD_TAIL)
+
+    def _send_cmd(self, cmd, data):
+        self.ack_cmd = 0
+        self._write_cmd(cmd, data)
         return self._wait_for_ack(cmd)
 
     def _wait_for_ack(self, cmd, timeout=100):
-        self.ack_cmd = 0
-        start_time = time.ticks_ms()
-        while time.ticks_diff(time.ticks_ms(), start_time) < timeout:
+        start_time = ticks_ms()
+        while ticks_diff(ticks_ms(), start_time) < timeout:
             self.update()
             if self.ack_cmd == cmd:
                 if self.ack_data[:2] == b'\x00\x00':
                     return True
                 else:
                     return False
+        self.ack_timeouts += 1
         return False
 
+    def _start_pipeline(self, commands):
+        self._pipeline = [cmd for cmd, _ in commands]
+        self._pipe_acked = 0
+        self._pipe_failed = 0
+
+    def _send_pipelined(self, commands, window=4, timeout=100):
+        """Send (cmd, data) pairs keeping up to `window` of them awaiting an ACK.
+
+        Returns True when every command was acknowledged successfully. `timeout`
+        (ms) applies to the wait for each next ACK.
+        """
+        self._start_pipeline(commands)
+        sent = 0
+        try:
+            while self._pipe_acked < len(commands):
+                while sent < len(commands) and sent - self._pipe_acked < window:
+                    self._write_cmd(*commands[sent])
+                    sent += 1
+                acked = self._pipe_acked
+                start_time = ticks_ms()
+                while self._pipe_acked == acked:
+                    if ticks_diff(ticks_ms(), start_time) >= timeout:
+                        self.ack_timeouts += 1
+                        return False
+                    self.update()
+            return self._pipe_failed == 0
+        finally:
+            self._pipeline = None
+
+    def _profile_commands(self, profile, current):
+        """List the (cmd, data) pairs needed to move `current` to `profile`."""
+        commands = []
+        max_values = (profile.get("max_moving_gate", current["max_moving_gate"]),
+                      profile.get("max_stationary_gate", current["max_stationary_gate"]),
+                      profile.get("inactivity_time", current["inactivity_time"]))
+        if max_values != (current["max_moving_gate"], current["max_stationary_gate"], current["inactivity_time"]):
+            commands.append((SET_MAX_CMD, struct.pack('<HIHIHI', 0, max_values[0], 1, max_values[1], 2, max_values[2])))
+        moving = self._wanted_sensitivity(profile, current, "moving_sensitivity")
+        stationary = self._wanted_sensitivity(profile, current, "stationary_sensitivity")
+        for gate in range(9):
+            if moving[gate] != current["moving_sensitivity"][gate] or stationary[gate] != current["stationary_sensitivity"][gate]:
+                commands.append((SET_SENSITIVITY_CMD, struct.pack('<HIHIHI', 0, gate, 1, moving[gate], 2, stationary[gate])))
+        engineering = profile.get("engineering_mode")
+        if engineering is not None and engineering != self.engineering_mode:
+            commands.append((ENABLE_ENGINEERING_CMD if engineering else END_ENGINEERING_CMD, b''))
+        return commands
+
+    def _wanted_sensitivity(self, profile, current, key):
+        # Profile values for `key`, with None and the unsettable stationary gates taken from `current`
+        have = current[key]
+        wanted = list(profile.get(key, have))
+        fixed = _FIXED_STATIONARY_GATES if key == "stationary_sensitivity" else 0
+        for gate in range(9):
+            if gate < fixed or wanted[gate] is None:
+                wanted[gate] = have[gate]
+        return wanted
+
+    def _profile_matches(self, profile, current):
+        for key, value in current.items():
+            if key in profile:
+                wanted = profile[key]
+                if isinstance(value, list):
+                    wanted = self._wanted_sensitivity(profile, current, key)
+                if wanted != value:
+                    return False
+        return True
+
+    def apply_profile(self, profile, window=4):
+        """Apply a configuration profile in a single config session.
+
+        profile keys (all optional): max_moving_gate, max_stationary_gate,
+        inactivity_time, moving_sensitivity and stationary_sensitivity (9
+        values each, one per gate; None keeps a gate as it is, and stationary
+        gates 0 and 1 are always left alone) and engineering_mode. Only values that
+        differ from the radar's current parameters are sent, pipelined without
+        waiting for each ACK, then verified with one parameter readback.
+        """
+        if not self.enable_config():
+            return False
+        try:
+            current = self.read_parameters()
+            if current is None:
+                return False
+            commands = self._profile_commands(profile, current)
+            self.profile_changes = len(commands)
+            if not commands:
+                return True
+            if not self._send_pipelined(commands, window):
+                return False
+            current = self.read_parameters()
+            return current is not None and self._profile_matches(profile, current)
+        finally:
+            self.disable_config()
+
     def enable_config(self):
-        return self._send_cmd(ENABLE_CONFIG_CMD, b'0100')
+        return self._send_cmd(ENABLE_CONFIG_CMD, b'\x01\x00')
 
     def disable_config(self):
         return self._send_cmd(END_CONFIG_CMD, b'')
@@ -157,6 +509,10 @@ class LD2410:
             return False
         return self.ack_data
 
+    def read_parameters(self):
+        """Read the current configuration as a dict, see parse_parameters()."""
+        return parse_parameters(self.get_parameter())
+
     def enable_engineering_mode(self):
         return self._send_cmd(ENABLE_ENGINEERING_CMD, b'')
 
@@ -186,4 +542,122 @@ class LD2410:
         return (self.target_state, self.moving_distance, self.moving_energy, self.stationary_distance, self.stationary_energy, self.detection_distance)
 
     def get_engineering_data(self):
-        return (self.max_moving_gate, self.max_stationary_gate, self.gate_moving_energy, self.gate_stationary_energy)
\ No newline at end of file
+        return (self.max_moving_gate, self.max_stationary_gate, self.gate_moving_energy, self.gate_stationary_energy)
+
+
+class AsyncLD2410(LD2410):
+    """LD2410 driver with awaitable commands.
+
+    A background task (see start()) keeps draining the UART, and every command
+    coroutine waits for its matching ACK instead of spinning in update().
+    Anything else that calls update() regularly can take the task's place.
+    """
+    def __init__(self, uart, poll_ms=10):
+        super().__init__(uart)
+        self.poll_ms = poll_ms
+        self._task = None
+        self._pending_cmd = None
+        self._ack_event = asyncio.Event()
+        self._cmd_lock = asyncio.Lock()
+        self._state_event = asyncio.Event()
+
+    def start(self):
+        """Start the background frame parser task."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._reader())
+        return self._task
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _reader(self):
+        while True:
+            try:
+                self.update()
+            except OSError as e:
+                print("LD2410 read error:", e)
+            await asyncio.sleep(self.poll_ms / 1000)
+
+    def _parse_ack(self, buf, off, data_length):
+        super()._parse_ack(buf, off, data_length)
+        if self.ack_cmd == self._pending_cmd or self._pipeline is not None:
+            self._ack_event.set()
+
+    def _state_changed(self, state, previous):
+        super()._state_changed(state, previous)
+        self._state_event.set()
+
+    async def wait_state_change(self):
+        """Wait for the next debounced transition and return the new state."""
+        await self._state_event.wait()
+        self._state_event.clear()
+        return self.presence_state
+
+    async def _send_cmd(self, cmd, data, timeout=100):
+        async with self._cmd_lock:
+            self.ack_cmd = 0
+            self._pending_cmd = cmd
+            self._ack_event.clear()
+            self._write_cmd(cmd, data)
+            try:
+                await asyncio.wait_for(self._ack_event.wait(), timeout / 1000)
+            except asyncio.TimeoutError:
+                self.ack_timeouts += 1
+                return False
+            finally:
+                self._pending_cmd = None
+            return self.ack_data[:2] == b'\x00\x00'
+
+    async def _send_pipelined(self, commands, window=4, timeout=100):
+        async with self._cmd_lock:
+            self._start_pipeline(commands)
+            sent = 0
+            try:
+                while self._pipe_acked < len(commands):
+                    while sent < len(commands) and sent - self._pipe_acked < window:
+                        self._write_cmd(*commands[sent])
+                        sent += 1
+                    acked = self._pipe_acked
+                    while self._pipe_acked == acked:
+                        self._ack_event.clear()
+                        try:
+                            await asyncio.wait_for(self._ack_event.wait(), timeout / 1000)
+                        except asyncio.TimeoutError:
+                            self.ack_timeouts += 1
+                            return False
+                return self._pipe_failed == 0
+            finally:
+                self._pipeline = None
+
+    async def apply_profile(self, profile, window=4):
+        if not await self.enable_config():
+            return False
+        try:
+            current = await self.read_parameters()
+            if current is None:
+                return False
+            commands = self._profile_commands(profile, current)
+            self.profile_changes = len(commands)
+            if not commands:
+                return True
+            if not await self._send_pipelined(commands, window):
+                return False
+            current = await self.read_parameters()
+            return current is not None and self._profile_matches(profile, current)
+        finally:
+            await self.disable_config()
+
+    async def get_parameter(self):
+        if await self._send_cmd(READ_PARAMETER_CMD, b'') == False:
+            return False
+        return self.ack_data
+
+    async def read_parameters(self):
+        return parse_parameters(await self.get_parameter())
+
+    async def get_firmware_version(self):
+        if await self._send_cmd(READ_FIRMWARE_VERSION_CMD, b'') == False:
+            return False
+        return struct.unpack('<HHI', self.ack_data[2:])
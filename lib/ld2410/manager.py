@@ -0,0 +1,83 @@
+import asyncio
+
+MERGE_ANY = 'any'
+MERGE_ALL = 'all'
+
+
+class RadarManager:
+    """Service several LD2410 radars from one task and merge them into a zone.
+
+    Every radar is polled by run(), so the radars do not need their own
+    reader tasks (AsyncLD2410 commands still get their ACKs). Radar states are
+    bit masks (1 stationary, 2 moving), so the zone state is their OR; with
+    MERGE_ALL it is 0 unless every radar sees a target.
+    """
+    def __init__(self, poll_ms=10, merge=MERGE_ANY):
+        self.poll_ms = poll_ms
+        self.merge = merge
+        self.radars = {}
+        self.zone_state = 0
+        self.on_zone_change = None
+        self._zone_event = asyncio.Event()
+        self._task = None
+
+    def add(self, name, radar):
+        """Register `radar` under `name`; the manager owns its on_state_change."""
+        self.radars[name] = radar
+        radar.on_state_change = self._radar_changed
+        return radar
+
+    def get(self, name):
+        return self.radars[name]
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def run(self):
+        while True:
+            self.update()
+            await asyncio.sleep(self.poll_ms / 1000)
+
+    def update(self):
+        """Drain every radar once and return the total number of frames decoded."""
+        frames = 0
+        for name, radar in self.radars.items():
+            try:
+                frames += radar.update()
+            except OSError as e:
+                print(f"LD2410 {name} read error:", e)
+        return frames
+
+    def _radar_changed(self, state, previous):
+        zone = self._merge_states()
+        if zone != self.zone_state:
+            previous_zone = self.zone_state
+            self.zone_state = zone
+            if self.on_zone_change is not None:
+                self.on_zone_change(zone, previous_zone)
+            self._zone_event.set()
+
+    def _merge_states(self):
+        # With MERGE_ALL every radar must see something, but not necessarily the same kind of target
+        zone = 0
+        for radar in self.radars.values():
+            state = radar.presence_state
+            if not state and self.merge == MERGE_ALL:
+                return 0
+            zone |= state
+        return zone
+
+    async def wait_zone_change(self):
+        """Wait for the merged zone state to change and return it."""
+        await self._zone_event.wait()
+        self._zone_event.clear()
+        return self.zone_state
+
+    def get_target_data(self):
+        """Return {name: get_target_data()} for every radar."""
+        return {name: radar.get_target_data() for name, radar in self.radars.items()}
+
+    def get_stats(self):
+        return {name: radar.get_stats() for name, radar in self.radars.items()}
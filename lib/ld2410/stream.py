@@ -0,0 +1,99 @@
+import asyncio
+import struct
+from array import array
+from ticks import ticks_ms, ticks_diff
+
+# Block layout (little endian):
+#   header: version (u8), frame count (u8), row size (u8), ticks_ms of first frame (u32)
+#   rows:   ms since previous frame (u8, saturates at 255), target state (u8),
+#           9 moving gate energies (u8), 9 stationary gate energies (u8)
+STREAM_VERSION = 1
+HEADER_FORMAT = '<BBBI'
+HEADER_SIZE = 7
+ROW_SIZE = 20
+
+
+class EngineeringStream:
+    """Batch LD2410 engineering-mode frames into binary blocks for MQTT.
+
+    Frames are copied into one of two preallocated array('B') blocks as the
+    parser decodes them; a full block is handed to run() for publishing while
+    the other one keeps filling. Frames arriving while both blocks are full
+    are dropped and counted.
+    """
+    def __init__(self, radar, frames_per_block=20):
+        assert 0 < frames_per_block < 256
+        self.radar = radar
+        self.frames_per_block = frames_per_block
+        size = HEADER_SIZE + frames_per_block * ROW_SIZE
+        self._blocks = (array('B', bytes(size)), array('B', bytes(size)))
+        self._active = 0
+        self._rows = 0
+        self._last_ms = 0
+        self._ready = None
+        self._event = asyncio.Event()
+
+        self.frames = 0
+        self.dropped = 0
+        self.blocks_sent = 0
+        radar.on_engineering = self._on_frame
+
+    def _on_frame(self, radar):
+        if self._rows == self.frames_per_block:
+            self.dropped += 1
+            return
+        block = self._blocks[self._active]
+        now = ticks_ms()
+        if self._rows == 0:
+            struct.pack_into(HEADER_FORMAT, block, 0, STREAM_VERSION, 0, ROW_SIZE, now & 0xffffffff)
+            dt = 0
+        else:
+            dt = min(ticks_diff(now, self._last_ms), 255)
+        self._last_ms = now
+
+        pos = HEADER_SIZE + self._rows * ROW_SIZE
+        block[pos] = dt
+        block[pos + 1] = radar.target_state
+        moving = radar.gate_moving_energy
+        stationary = radar.gate_stationary_energy
+        for i in range(9):
+            block[pos + 2 + i] = moving[i]
+            block[pos + 11 + i] = stationary[i]
+        self._rows += 1
+        self.frames += 1
+        if self._rows == self.frames_per_block:
+            self._swap()
+
+    def _swap(self):
+        if self._ready is not None:
+            return  # Previous block still being published
+        block = self._blocks[self._active]
+        block[1] = self._rows
+        self._ready = block
+        self._active ^= 1
+        self._rows = 0
+        self._event.set()
+
+    async def run(self, mqtt, topic="pico/sensor/mmWavesensor/engineering"):
+        """Publish every full block to `topic`."""
+        while True:
+            await self._event.wait()
+            self._event.clear()
+            if await mqtt.publish(topic, self._ready):
+                self.blocks_sent += 1
+            self._ready = None
+            if self._rows == self.frames_per_block:
+                self._swap()
+
+
+def decode_block(data):
+    """Decode a published block into a list of (ticks_ms, state, moving, stationary)."""
+    version, count, row_size, t = struct.unpack_from(HEADER_FORMAT, data, 0)
+    if version != STREAM_VERSION:
+        raise ValueError("Unsupported stream version %d" % version)
+    frames = []
+    for i in range(count):
+        pos = HEADER_SIZE + i * row_size
+        t += data[pos]
+        frames.append((t, data[pos + 1], list(data[pos + 2:pos + 11]), list(data[pos + 11:pos + 20])))
+    return frames
@@ -0,0 +1,26 @@
+try:
+    from micropython import const
+    from time import ticks_ms, ticks_us, ticks_diff, ticks_add
+except ImportError:
+    # Host-side (CPython) tests, replays and benchmarks. The counters wrap
+    # like MicroPython's (period 2**30), so wraparound bugs show up here too.
+    import time
+
+    _PERIOD = 1 << 30
+    _MASK = _PERIOD - 1
+    _HALF = _PERIOD >> 1
+
+    def const(x):
+        return x
+
+    def ticks_ms():
+        return int(time.monotonic() * 1000) & _MASK
+
+    def ticks_us():
+        return int(time.monotonic() * 1000000) & _MASK
+
+    def ticks_diff(a, b):
+        return ((a - b + _HALF) & _MASK) - _HALF
+
+    def ticks_add(a, b):
+        return (a + b) & _MASK
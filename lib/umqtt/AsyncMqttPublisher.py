@@ -0,0 +1,314 @@
+import asyncio
+import struct
+from umqtt.async_client import AsyncMQTTClient
+from umqtt.connection import ConnectionManager
+from umqtt.payload import encode_payload, describe_payload
+from ticks import ticks_ms, ticks_diff
+
+# Queue entry fields
+_PAYLOAD = 0
+_SHOWN = 1
+_RETAIN = 2
+_QOS = 3
+_PRIORITY = 4
+_QUEUED_AT = 5
+_SEQ = 6
+_BORROWED = 7
+
+
+class AsyncMqttPublisher:
+    """Asyncio counterpart of MqttPublisher with the same publish(topic, payload) API.
+
+    publish() only puts the message on a bounded outbound queue; one sender
+    task (see start()) drains the queue while a ConnectionManager keeps the
+    connection up (keepalive pings, backoff reconnects). The queue
+    holds at most one message per topic: a newer message replaces an unsent
+    one (latest value wins). Higher-priority topics are sent first.
+
+    With an OfflineLog, dict readings published while the broker is
+    unreachable are also stored on flash. After reconnecting, the backlog is
+    replayed to `<topic>/backlog` as {"ts": <time.time()>, "data": <reading>},
+    replay_batch records every replay_interval seconds, once live messages
+    have been sent. Binary readings (see set_codec()) are replayed as a
+    4-byte little-endian timestamp followed by the payload.
+
+    Each message is printed to the console only when `verbose` is set.
+    """
+    def __init__(self, mqtt_config, max_queue=32, retry_delay=5,
+                 offline_log=None, replay_batch=10, replay_interval=1,
+                 verbose=False, tx_size=256):
+        self.mqtt_config = mqtt_config
+        self.client = self.init_mqtt_client(mqtt_config)
+        self.connection = ConnectionManager(
+            self.client, self.connect_mqtt,
+            backoff_base=mqtt_config.get("backoff_base", 1),
+            backoff_max=mqtt_config.get("backoff_max", 60))
+        self.max_queue = max_queue
+        self.retry_delay = retry_delay
+        self.offline_log = offline_log
+        self.replay_batch = replay_batch
+        self.replay_interval = replay_interval
+        self.verbose = verbose
+        self.priorities = {}
+        self.codecs = {}
+        self._queue = {}
+        self._spare = []
+        # Borrowed payloads are copied here when they leave the queue
+        self._tx = bytearray(tx_size)
+        self._tx_mv = memoryview(self._tx)
+        self._seq = 0
+        self._event = asyncio.Event()
+        self._task = None
+        self.availability_topic = None
+        self._online = None
+        self._offline = None
+
+        self.queued = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.sent = 0
+        self.failed = 0
+        self.latency_ms_max = 0
+        self._latency_ms_total = 0
+
+    def init_mqtt_client(self, config):
+        """Initialize MQTT client."""
+        client_id = config.get("client_id")
+        if client_id is None:
+            import machine
+            import ubinascii
+            client_id = ubinascii.hexlify(machine.unique_id())
+        return AsyncMQTTClient(
+            client_id,
+            config["broker"],
+            port=config.get("port", 1883),
+            user=config.get("user", None),
+            password=config.get("password", None),
+            keepalive=config.get("keepalive", 60),
+            timeout=config.get("timeout", 5),
+            inflight=config.get("inflight", 0)
+        )
+
+    @property
+    def connected(self):
+        return self.client.connected
+
+    def set_codec(self, topic, codec):
+        """Encode dict payloads for `topic` with `codec` (see umqtt.codec) instead of JSON."""
+        self.codecs[topic] = codec
+
+    def set_priority(self, topic, priority):
+        """Messages on higher-priority topics leave the queue first (default 0)."""
+        self.priorities[topic] = priority
+
+    def set_availability(self, topic, online=b"online", offline=b"offline"):
+        """Retain `online` on `topic` after every connect; the broker publishes `offline` as last will.
+
+        Call before start().
+        """
+        self.availability_topic = topic.encode() if isinstance(topic, str) else topic
+        self._online = online
+        self._offline = offline
+        self.client.set_last_will(self.availability_topic, offline, retain=True, qos=1)
+
+    def start(self):
+        """Start the connection manager and the sender task."""
+        self.connection.start()
+        if self._task is None:
+            self._task = asyncio.create_task(self._sender())
+        return self._task
+
+    async def connect_mqtt(self):
+        """Connect to MQTT broker, return True on success."""
+        try:
+            await self.client.connect()
+            print(f"Connected to MQTT broker {self.mqtt_config['broker']}")
+            if self.availability_topic is not None:
+                # Birth message goes out before anything queued
+                await self.client.publish(self.availability_topic, self._online, True, 1)
+            return True
+        except Exception as e:
+            print(f"Failed to connect to MQTT: {e!r}")
+            if self.client.connected:
+                self.client.abort()
+            return False
+
+    async def publish(self, topic, payload, retain=False, qos=0, borrowed=False):
+        """Queue a message for the sender task.
+
+        `topic` may be a str or pre-encoded bytes. Returns False if the queue is
+        full of higher-priority messages and this one was dropped. Binary
+        payloads are copied, so callers may reuse them, unless `borrowed` is
+        set: the caller (see SensorPublisher) then promises not to touch the
+        buffer until its next publish() on the same topic, which replaces this
+        message. Dict and borrowed payloads count as readings for the offline log.
+        """
+        reading = borrowed or isinstance(payload, dict)
+        shown = describe_payload(payload) if self.verbose else None
+        codec = self.codecs.get(topic)
+        payload = encode_payload(payload, codec)
+        if not borrowed and not isinstance(payload, bytes):
+            payload = bytes(payload)
+        if reading and self.offline_log is not None and not self.client.connected:
+            self.offline_log.append(topic.encode() if isinstance(topic, str) else topic, payload, retain,
+                                    codec is not None and codec.binary)
+        priority = self.priorities.get(topic, 0)
+        queue = self._queue
+        entry = queue.get(topic)
+        if entry is not None:
+            self.coalesced += 1
+        elif len(queue) >= self.max_queue and not self._evict(priority):
+            self.dropped += 1
+            return False
+        elif self._spare:
+            entry = queue[topic] = self._spare.pop()
+        else:
+            entry = queue[topic] = [None] * 8
+        self._seq += 1
+        entry[_PAYLOAD] = payload
+        entry[_SHOWN] = shown
+        entry[_RETAIN] = retain
+        entry[_QOS] = qos
+        entry[_PRIORITY] = priority
+        entry[_QUEUED_AT] = ticks_ms()
+        entry[_SEQ] = self._seq
+        entry[_BORROWED] = borrowed
+        self.queued += 1
+        self._event.set()
+        return True
+
+    def _evict(self, priority):
+        # Make room by dropping the oldest message of the lowest priority below `priority`
+        victim = None
+        victim_key = None
+        for topic, entry in self._queue.items():
+            key = (entry[_PRIORITY], entry[_SEQ])
+            if entry[_PRIORITY] < priority and (victim is None or key < victim_key):
+                victim = topic
+                victim_key = key
+        if victim is None:
+            return False
+        del self._queue[victim]
+        self.dropped += 1
+        return True
+
+    def _next(self):
+        best = None
+        best_entry = None
+        for topic, entry in self._queue.items():
+            if best is None or entry[_PRIORITY] > best_entry[_PRIORITY] or (
+                    entry[_PRIORITY] == best_entry[_PRIORITY] and entry[_SEQ] < best_entry[_SEQ]):
+                best = topic
+                best_entry = entry
+        return best, best_entry
+
+    async def _sender(self):
+        while True:
+            log = self.offline_log
+            if not self._queue:
+                self._event.clear()
+                if log is not None and log.backlog() and self.client.connected:
+                    await self._replay(log)
+                    await self._wait_event(self.replay_interval)
+                else:
+                    await self._event.wait()
+                continue
+            if not self.client.connected:
+                if log is not None:
+                    log.maybe_flush()
+                await self.connection.wait_connected(self.retry_delay)
+                continue
+            topic, entry = self._next()
+            del self._queue[topic]
+            if await self._send(topic, entry, self._take(entry)):
+                if len(self._spare) < self.max_queue:
+                    entry[_PAYLOAD] = None
+                    self._spare.append(entry)
+                continue
+            # Put it back unless a newer message for the topic arrived meanwhile
+            if topic not in self._queue:
+                self._queue[topic] = entry
+            await asyncio.sleep(self.retry_delay)
+
+    def _take(self, entry):
+        # A borrowed buffer may be re-rendered while the send is in progress
+        payload = entry[_PAYLOAD]
+        if not entry[_BORROWED]:
+            return payload
+        n = len(payload)
+        if n > len(self._tx):
+            return bytes(payload)
+        self._tx_mv[:n] = payload
+        return self._tx_mv[:n]
+
+    async def _wait_event(self, timeout):
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _replay(self, log):
+        """Send one batch of stored readings and mark them replayed."""
+        last = None
+        try:
+            for seq, ts, topic, payload, retain, binary in log.read_batch(self.replay_batch):
+                if binary:
+                    msg = struct.pack('<I', ts) + payload
+                else:
+                    msg = b'{"ts":' + str(ts).encode() + b',"data":' + payload + b'}'
+                await self.client.publish(topic + b'/backlog', msg)
+                last = seq
+        except Exception as e:
+            print(f"Failed to replay offline backlog: {e!r}")
+            self.failed += 1
+        if last is not None:
+            log.ack(last)
+
+    async def _send(self, topic, entry, payload):
+        try:
+            await self.client.publish(topic.encode() if isinstance(topic, str) else topic,
+                                      payload, entry[_RETAIN], entry[_QOS])
+        except Exception as e:
+            print(f"Failed to publish to {topic}: {e!r}")
+            self.failed += 1
+            return False
+        latency = ticks_diff(ticks_ms(), entry[_QUEUED_AT])
+        self._latency_ms_total += latency
+        if latency > self.latency_ms_max:
+            self.latency_ms_max = latency
+        self.sent += 1
+        if self.verbose:
+            print(f"Published to {topic}: {entry[_SHOWN]}")
+        return True
+
+    def get_stats(self):
+        """Return queue and delivery counters as a dict."""
+        return {
+            "connected": self.client.connected,
+            "queue_depth": len(self._queue),
+            "queued": self.queued,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "sent": self.sent,
+            "failed": self.failed,
+            "latency_ms_avg": self._latency_ms_total // self.sent if self.sent else 0,
+            "latency_ms_max": self.latency_ms_max,
+            "offline_log": self.offline_log.get_stats() if self.offline_log else None,
+            "qos1": self.client.inflight.get_stats() if self.client.inflight else None,
+            "connection": self.connection.get_stats(),
+        }
+
+    async def disconnect(self):
+        """Stop the sender task and disconnect from MQTT."""
+        self.connection.stop()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        try:
+            if self.availability_topic is not None and self.client.connected:
+                # A clean DISCONNECT does not trigger the last will
+                await self.client.publish(self.availability_topic, self._offline, True, 1)
+            await self.client.disconnect()
+            print("MQTT disconnected")
+        except Exception as e:
+            print(f"Error disconnecting MQTT: {e}")
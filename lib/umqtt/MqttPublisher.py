@@ -3,22 +3,49 @@ import time
 import ubinascii
 import machine
 from umqtt.simple import MQTTClient
-import ujson as json
+from umqtt.payload import encode_payload, describe_payload
+from umqtt.connection import Backoff
 
 class MqttPublisher:
-    def __init__(self, mqtt_config, connect_wifi=False, wifi_config=None):
+    # Call service() regularly: it sends keepalive pings, drops the link when a
+    # PINGRESP goes missing and retries the connection with jittered
+    # exponential backoff. While a retry is not due, publish() fails fast.
+    def __init__(self, mqtt_config, connect_wifi=False, wifi_config=None, verbose=False):
         self.mqtt_config = mqtt_config
         self.wifi_config = wifi_config
+        self.verbose = verbose
+        self.codecs = {}
         self.wlan = None
         self.client = None
+        self.backoff = Backoff(mqtt_config.get("backoff_base", 1), mqtt_config.get("backoff_max", 60))
+        keepalive = mqtt_config.get("keepalive", 60)
+        self.ping_interval_ms = keepalive * 500
+        self.ping_timeout_ms = mqtt_config.get("timeout", 5) * 1000
+        self._retry_at = None
+        self._last_ping = 0
+        self._ping_sent_at = None
+        self._pingresps = 0
+        self._connected_at = None
+
+        self.connects = 0
+        self.reconnects = 0
+        self.connect_failures = 0
+        self.pings = 0
+        self.ping_timeouts = 0
         
         if connect_wifi and wifi_config:
             self.wifi_connect(wifi_config["ssid"], wifi_config["password"])
         
-        self.client = self.init_mqtt_client(mqtt_config)
+        # One client for the whole run, so its QoS 1 window survives reconnects
+        self._mqtt = self.init_mqtt_client(mqtt_config)
+        self.client = self._mqtt
         self.connect_mqtt()
         print("MQTT connected")
 
+    def set_codec(self, topic, codec):
+        """Encode dict payloads for `topic` with `codec` (see umqtt.codec) instead of JSON."""
+        self.codecs[topic] = codec
+
     def wifi_connect(self, ssid, password):
         """Connect to Wi-Fi with a timeout."""
         self.wlan = network.WLAN(network.STA_IF)
@@ -48,7 +75,8 @@ class MqttPublisher:
             port=config.get("port", 1883),
             user=config.get("user", None),
             password=config.get("password", None),
-            keepalive=config.get("keepalive", 60)
+            keepalive=config.get("keepalive", 60),
+            inflight=config.get("inflight", 0)
         )
 
     def connect_mqtt(self):
@@ -60,9 +88,14 @@ class MqttPublisher:
             print(f"Failed to connect to MQTT: {e}")
             self.client = None
             raise
+        self.connects += 1
+        self._connected_at = self._last_ping = time.ticks_ms()
+        self._ping_sent_at = None
 
     def reconnect(self):
-        """Reconnect to Wi-Fi and MQTT if necessary."""
+        """Reconnect to Wi-Fi and MQTT if necessary; False until the backoff delay has passed."""
+        if self._retry_at is not None and time.ticks_diff(self._retry_at, time.ticks_ms()) > 0:
+            return False
         print("Attempting to reconnect...")
         try:
             if self.wifi_config and not self.check_wifi():
@@ -70,20 +103,82 @@ class MqttPublisher:
                 self.wifi_connect(self.wifi_config["ssid"], self.wifi_config["password"])
             
             if self.client is None:
-                self.client = self.init_mqtt_client(self.mqtt_config)
+                self.client = self._mqtt
             
             self.connect_mqtt()
+            self.reconnects += 1
+            self.backoff.reset()
+            self._retry_at = None
             print("Reconnection successful")
             return True
         except Exception as e:
             print(f"Reconnection failed: {e}")
             self.client = None
+            self.connect_failures += 1
+            self._retry_at = time.ticks_add(time.ticks_ms(), int(self.backoff.next_delay() * 1000))
             return False
 
+    def _drop(self):
+        # Forget a dead connection; the next reconnect() reuses the client
+        if self.client is not None:
+            try:
+                self.client.sock.close()
+            except Exception:
+                pass
+        self.client = None
+        self._connected_at = None
+
+    def service(self):
+        """Handle incoming packets, keepalive pings and reconnects; returns whether connected."""
+        if self.client is None:
+            return self.reconnect()
+        try:
+            self.client.check_msg()
+            now = time.ticks_ms()
+            if self._ping_sent_at is not None:
+                if self.client.pingresps != self._pingresps:
+                    self._ping_sent_at = None
+                elif time.ticks_diff(now, self._ping_sent_at) > self.ping_timeout_ms:
+                    self.ping_timeouts += 1
+                    print("MQTT PINGRESP missing, dropping connection")
+                    self._drop()
+                    return False
+            if (self._ping_sent_at is None and self.ping_interval_ms
+                    and time.ticks_diff(now, self._last_ping) >= self.ping_interval_ms):
+                self._pingresps = self.client.pingresps
+                self.client.ping()
+                self.pings += 1
+                self._last_ping = self._ping_sent_at = now
+            return True
+        except Exception as e:
+            print(f"MQTT connection lost: {e}")
+            self._drop()
+            return False
+
+    def get_stats(self):
+        """Return connection counters (and the QoS 1 window's) as a dict."""
+        uptime = time.ticks_diff(time.ticks_ms(), self._connected_at) // 1000 if self._connected_at is not None else 0
+        return {
+            "connected": self.client is not None,
+            "uptime_s": uptime,
+            "connects": self.connects,
+            "reconnects": self.reconnects,
+            "connect_failures": self.connect_failures,
+            "backoff_s": round(self.backoff.delay, 1),
+            "pings": self.pings,
+            "ping_timeouts": self.ping_timeouts,
+            "qos1": self._mqtt.get_stats(),
+        }
+
     def publish(self, topic, payload):
-        """Publish a message with reconnection handling."""
-        if isinstance(payload, dict):
-            payload = json.dumps(payload)
+        """Publish a message with reconnection handling.
+
+        topic may be a str or pre-encoded bytes; payload may be a dict (sent as
+        JSON), a str, or a bytes-like binary buffer such as a rendered
+        PayloadTemplate. Messages are only printed when `verbose` is set.
+        """
+        shown = describe_payload(payload) if self.verbose else None
+        payload = encode_payload(payload, self.codecs.get(topic))
         
         # Check connections
         if self.wifi_config and not self.check_wifi():
@@ -91,18 +186,17 @@ class MqttPublisher:
             if not self.reconnect():
                 return False
         
-        if self.client is None:
-            print("MQTT client not initialized, attempting to reconnect...")
-            if not self.reconnect():
-                return False
+        if self.client is None and not self.reconnect():
+            return False
         
         try:
-            self.client.publish(topic.encode(), payload.encode())
-            print(f"Published to {topic}: {payload}")
+            self.client.publish(topic.encode() if isinstance(topic, str) else topic, payload)
+            if self.verbose:
+                print(f"Published to {topic}: {shown}")
             return True
         except Exception as e:
             print(f"Failed to publish to {topic}: {e}")
-            self.client = None  # Mark client as disconnected
+            self._drop()  # Mark client as disconnected
             return False
 
     def disconnect(self):
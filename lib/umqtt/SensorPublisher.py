@@ -0,0 +1,51 @@
+from umqtt.template import PayloadTemplate
+
+
+class SensorPublisher:
+    """Publishes one sensor's readings on a fixed topic through AsyncMqttPublisher.
+
+    The topic is encoded once and every reading is rendered into the same
+    PayloadTemplate buffer, which the publisher queue borrows instead of
+    copying, so a steady stream of readings creates almost no garbage:
+
+        climate = SensorPublisher(mqtt, "pico/sensor/temperaturenhumidity",
+                                  '{"temperature":%d,"humidity":%d}')
+        await climate.publish(temp, hum)
+
+    `template` may also be a binary StructCodec with the same field order; it
+    is registered as the topic's codec so the offline log knows it is binary.
+    With a DeadbandFilter as `filter`, readings that did not move enough are
+    dropped before rendering, and a reading only becomes the filter's new
+    baseline once the queue accepted it.
+    """
+    def __init__(self, mqtt, topic, template, retain=False, qos=0, priority=None, text_size=32, filter=None):
+        self.mqtt = mqtt
+        self.topic = topic.encode() if isinstance(topic, str) else topic
+        if isinstance(template, (str, bytes)):
+            template = PayloadTemplate(template, text_size)
+        self.template = template
+        if template.binary:
+            mqtt.set_codec(self.topic, template)
+        self.retain = retain
+        self.qos = qos
+        self.filter = filter
+        if priority is not None:
+            mqtt.set_priority(self.topic, priority)
+
+    async def publish(self, *values):
+        """Render one value per template field and queue the message."""
+        return await self.publish_values(values)
+
+    async def publish_values(self, values):
+        """Like publish(), but takes a (reusable) sequence of values.
+
+        Returns False if the reading was suppressed by the filter or dropped by the queue.
+        """
+        filter = self.filter
+        if filter is not None and not filter.check(values):
+            return False
+        sent = await self.mqtt.publish(self.topic, self.template.render(values),
+                                       self.retain, self.qos, borrowed=True)
+        if sent and filter is not None:
+            filter.commit(values)
+        return sent
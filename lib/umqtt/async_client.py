@@ -0,0 +1,273 @@
+import asyncio
+import struct
+from umqtt.simple import MQTTException
+from umqtt.inflight import InflightWindow
+
+
+def _header(op, sz):
+    """Fixed header: packet type byte plus variable-length remaining size."""
+    hdr = bytearray(5)
+    hdr[0] = op
+    i = 1
+    while sz > 0x7F:
+        hdr[i] = (sz & 0x7F) | 0x80
+        sz >>= 7
+        i += 1
+    hdr[i] = sz
+    return hdr[:i + 1]
+
+
+def _str(s):
+    return struct.pack("!H", len(s)) + s
+
+
+class AsyncMQTTClient:
+    """MQTT 3.1.1 client on asyncio streams.
+
+    Connect, writes and ACK waits are bounded by `timeout` (seconds), and a
+    background task reads incoming packets, so a slow or dead broker only
+    delays the coroutine that is talking to it.
+
+    With `inflight` > 0, QoS 1 publishes return once written: up to `inflight`
+    messages wait for their PUBACK at once, PUBACKs are matched by the reader
+    task, and unacknowledged messages are re-sent after the next connect().
+    """
+    def __init__(
+        self,
+        client_id,
+        server,
+        port=0,
+        user=None,
+        password=None,
+        keepalive=0,
+        timeout=5,
+        inflight=0,
+    ):
+        if port == 0:
+            port = 1883
+        self.client_id = client_id
+        self.server = server
+        self.port = port
+        self.user = user
+        self.pswd = password
+        self.keepalive = keepalive
+        self.timeout = timeout
+        self.cb = None
+        self.pid = 0
+        self.lw_topic = None
+        self.lw_msg = None
+        self.lw_qos = 0
+        self.lw_retain = False
+        self.connected = False
+        self.closed = asyncio.Event()
+        self.closed.set()
+        self.pingresps = 0
+
+        self._reader = None
+        self._writer = None
+        self._read_task = None
+        self._write_lock = asyncio.Lock()
+        self._acks = {}
+        self._pingresp = asyncio.Event()
+        self.inflight = InflightWindow(inflight) if inflight else None
+        self._window_free = asyncio.Event()
+
+    def set_callback(self, f):
+        self.cb = f
+
+    def set_last_will(self, topic, msg, retain=False, qos=0):
+        assert 0 <= qos <= 2
+        assert topic
+        self.lw_topic = topic
+        self.lw_msg = msg
+        self.lw_qos = qos
+        self.lw_retain = retain
+
+    async def connect(self, clean_session=True):
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.server, self.port), self.timeout)
+        try:
+            msg = bytearray(b"\x00\x04MQTT\x04\x02\0\0")
+            msg[7] = clean_session << 1
+            if self.user:
+                msg[7] |= 0xC0
+            if self.keepalive:
+                assert self.keepalive < 65536
+                msg[8] = self.keepalive >> 8
+                msg[9] = self.keepalive & 0x00FF
+            payload = _str(self.client_id)
+            if self.lw_topic:
+                msg[7] |= 0x4 | (self.lw_qos & 0x1) << 3 | (self.lw_qos & 0x2) << 3
+                msg[7] |= self.lw_retain << 5
+                payload += _str(self.lw_topic) + _str(self.lw_msg)
+            if self.user:
+                payload += _str(self.user) + _str(self.pswd)
+            await self._send(_header(0x10, len(msg) + len(payload)), msg, payload)
+
+            resp = await asyncio.wait_for(self._reader.readexactly(4), self.timeout)
+            if resp[0] != 0x20 or resp[1] != 0x02:
+                raise MQTTException("Unexpected CONNACK")
+            if resp[3] != 0:
+                raise MQTTException(resp[3])
+        except BaseException:
+            self._close()
+            raise
+        self.connected = True
+        self.closed.clear()
+        self._read_task = asyncio.create_task(self._read_loop())
+        if self.inflight is not None:
+            for pid, topic, msg, retain in self.inflight.pending():
+                await self._send(_header(0x3A | retain, 4 + len(topic) + len(msg)),
+                                 _str(topic) + struct.pack("!H", pid), msg)
+                self.inflight.retransmitted += 1
+        return resp[2] & 1
+
+    async def disconnect(self):
+        try:
+            if self.connected:
+                await self._send(b"\xe0\0")
+        finally:
+            self._close()
+
+    async def ping(self, wait=False):
+        """Send PINGREQ; with wait=True, return whether PINGRESP arrived in time."""
+        self._pingresp.clear()
+        await self._send(b"\xc0\0")
+        if not wait:
+            return True
+        try:
+            await asyncio.wait_for(self._pingresp.wait(), self.timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def publish(self, topic, msg, retain=False, qos=0):
+        assert qos in (0, 1)
+        sz = 2 + len(topic) + len(msg)
+        if qos:
+            sz += 2
+        assert sz < 2097152
+        hdr = _header(0x30 | qos << 1 | retain, sz)
+        if qos == 0:
+            await self._send(hdr, _str(topic), msg)
+            return
+        window = self.inflight
+        if window is not None:
+            while window.full():
+                self._window_free.clear()
+                await asyncio.wait_for(self._window_free.wait(), self.timeout)
+            pid = self._next_pid()
+            # Registered first: the PUBACK may be handled while _send() drains
+            window.add(pid, topic, msg, retain)
+            try:
+                await self._send(hdr, _str(topic) + struct.pack("!H", pid), msg)
+            except BaseException:
+                window.discard(pid)
+                raise
+            return pid
+        pid = self._next_pid()
+        event = self._acks[pid] = asyncio.Event()
+        try:
+            await self._send(hdr, _str(topic) + struct.pack("!H", pid), msg)
+            await asyncio.wait_for(event.wait(), self.timeout)
+        finally:
+            self._acks.pop(pid, None)
+        return pid
+
+    async def subscribe(self, topic, qos=0):
+        assert self.cb is not None, "Subscribe callback is not set"
+        pid = self._next_pid()
+        event = self._acks[pid] = asyncio.Event()
+        try:
+            await self._send(_header(0x82, 2 + 2 + len(topic) + 1), struct.pack("!H", pid),
+                             _str(topic), bytes([qos]))
+            await asyncio.wait_for(event.wait(), self.timeout)
+        finally:
+            self._acks.pop(pid, None)
+
+    def _next_pid(self):
+        self.pid = self.pid % 65535 + 1
+        if self.inflight is not None:
+            while self.pid in self.inflight.packets:
+                self.pid = self.pid % 65535 + 1
+        return self.pid
+
+    async def _send(self, *parts):
+        if self._writer is None:
+            raise OSError(-1)
+        async with self._write_lock:
+            for part in parts:
+                self._writer.write(part)
+            try:
+                await asyncio.wait_for(self._writer.drain(), self.timeout)
+            except Exception:
+                self._close()
+                raise
+
+    async def _read_len(self):
+        n = 0
+        sh = 0
+        while 1:
+            b = (await self._reader.readexactly(1))[0]
+            n |= (b & 0x7F) << sh
+            if not b & 0x80:
+                return n
+            sh += 7
+
+    async def _read_loop(self):
+        try:
+            while True:
+                op = (await self._reader.readexactly(1))[0]
+                sz = await self._read_len()
+                body = await self._reader.readexactly(sz) if sz else b""
+                await self._handle(op, body)
+        except Exception as e:
+            if self.connected:
+                print(f"MQTT connection lost: {e!r}")
+            self._read_task = None
+            self._close()
+
+    async def _handle(self, op, body):
+        kind = op & 0xF0
+        if kind == 0x30:  # PUBLISH
+            topic_len = (body[0] << 8) | body[1]
+            topic = body[2:2 + topic_len]
+            pos = 2 + topic_len
+            if op & 6:
+                pid = (body[pos] << 8) | body[pos + 1]
+                pos += 2
+            if self.cb:
+                self.cb(topic, body[pos:])
+            if op & 6 == 2:
+                await self._send(b"\x40\x02" + struct.pack("!H", pid))
+        elif kind == 0x40 or kind == 0x90:  # PUBACK, SUBACK
+            pid = (body[0] << 8) | body[1]
+            if kind == 0x40 and self.inflight is not None:
+                if self.inflight.ack(pid):
+                    self._window_free.set()
+                return
+            event = self._acks.get(pid)
+            if event is not None:
+                event.set()
+        elif kind == 0xD0:  # PINGRESP
+            self.pingresps += 1
+            self._pingresp.set()
+
+    def abort(self):
+        """Drop the connection without sending DISCONNECT (e.g. a dead link)."""
+        self._close()
+
+    def _close(self):
+        self.connected = False
+        self.closed.set()
+        if self._read_task is not None:
+            if self._read_task is not asyncio.current_task():
+                self._read_task.cancel()
+            self._read_task = None
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            except Exception:
+                pass
+            self._writer = None
+        self._reader = None
@@ -0,0 +1,179 @@
+import json
+import struct
+
+
+class JsonCodec:
+    """Default codec: dicts as JSON text."""
+    binary = False
+
+    def encode(self, obj):
+        return json.dumps(obj).encode()
+
+    def decode(self, data):
+        return json.loads(data)
+
+
+JSON = JsonCodec()
+
+
+class StructCodec:
+    """Fixed-layout binary payload: a schema id byte, then struct-packed fields.
+
+    `names` are the dict keys in field order and `fmt` their struct codes
+    (little-endian), e.g. StructCodec(1, ("temperature", "humidity"), "bB").
+    Like PayloadTemplate, render(values) packs into one reusable buffer, so a
+    StructCodec can be handed to SensorPublisher in place of a template.
+    """
+    binary = True
+
+    def __init__(self, schema_id, names, fmt):
+        self.schema_id = schema_id
+        self.names = tuple(names)
+        self.fields = len(self.names)
+        self.fmt = '<B' + fmt
+        self._buf = bytearray(struct.calcsize(self.fmt))
+
+    def render(self, values):
+        struct.pack_into(self.fmt, self._buf, 0, self.schema_id, *values)
+        return self._buf
+
+    def encode(self, obj):
+        return bytes(self.render([obj[name] for name in self.names]))
+
+    def decode(self, data):
+        values = struct.unpack_from(self.fmt, data, 0)
+        if values[0] != self.schema_id:
+            raise ValueError("Payload schema %d, expected %d" % (values[0], self.schema_id))
+        return dict(zip(self.names, values[1:]))
+
+
+def _cbor_head(out, major, n):
+    major <<= 5
+    if n < 24:
+        out.append(major | n)
+    elif n < 0x100:
+        out.append(major | 24)
+        out.append(n)
+    elif n < 0x10000:
+        out.append(major | 25)
+        out += struct.pack('>H', n)
+    elif n < 0x100000000:
+        out.append(major | 26)
+        out += struct.pack('>I', n)
+    else:
+        out.append(major | 27)
+        out += struct.pack('>Q', n)
+
+
+def _cbor_encode(out, obj):
+    if obj is False or obj is True:
+        out.append(0xF5 if obj else 0xF4)
+    elif obj is None:
+        out.append(0xF6)
+    elif isinstance(obj, int):
+        if obj >= 0:
+            _cbor_head(out, 0, obj)
+        else:
+            _cbor_head(out, 1, -1 - obj)
+    elif isinstance(obj, float):
+        single = struct.pack('>f', obj)
+        if struct.unpack('>f', single)[0] == obj:
+            out.append(0xFA)
+            out += single
+        else:
+            out.append(0xFB)
+            out += struct.pack('>d', obj)
+    elif isinstance(obj, str):
+        data = obj.encode()
+        _cbor_head(out, 3, len(data))
+        out += data
+    elif isinstance(obj, (bytes, bytearray)):
+        _cbor_head(out, 2, len(obj))
+        out += obj
+    elif isinstance(obj, (list, tuple)):
+        _cbor_head(out, 4, len(obj))
+        for item in obj:
+            _cbor_encode(out, item)
+    elif isinstance(obj, dict):
+        _cbor_head(out, 5, len(obj))
+        for key, value in obj.items():
+            _cbor_encode(out, key)
+            _cbor_encode(out, value)
+    else:
+        raise TypeError("Cannot CBOR-encode %r" % (obj,))
+
+
+def _cbor_decode(data, pos):
+    ib = data[pos]
+    pos += 1
+    major = ib >> 5
+    info = ib & 0x1F
+    if major == 7:
+        if info == 20:
+            return False, pos
+        if info == 21:
+            return True, pos
+        if info == 22:
+            return None, pos
+        if info == 26:
+            return struct.unpack_from('>f', data, pos)[0], pos + 4
+        if info == 27:
+            return struct.unpack_from('>d', data, pos)[0], pos + 8
+        raise ValueError("Unsupported CBOR simple value %d" % info)
+    if info < 24:
+        n = info
+    elif info == 24:
+        n = data[pos]
+        pos += 1
+    elif info == 25:
+        n = struct.unpack_from('>H', data, pos)[0]
+        pos += 2
+    elif info == 26:
+        n = struct.unpack_from('>I', data, pos)[0]
+        pos += 4
+    elif info == 27:
+        n = struct.unpack_from('>Q', data, pos)[0]
+        pos += 8
+    else:
+        raise ValueError("Unsupported CBOR length %d" % info)
+    if major == 0:
+        return n, pos
+    if major == 1:
+        return -1 - n, pos
+    if major == 2:
+        return bytes(data[pos:pos + n]), pos + n
+    if major == 3:
+        return bytes(data[pos:pos + n]).decode(), pos + n
+    if major == 4:
+        items = []
+        for _ in range(n):
+            item, pos = _cbor_decode(data, pos)
+            items.append(item)
+        return items, pos
+    if major == 5:
+        obj = {}
+        for _ in range(n):
+            key, pos = _cbor_decode(data, pos)
+            obj[key], pos = _cbor_decode(data, pos)
+        return obj, pos
+    raise ValueError("Unsupported CBOR major type %d" % major)
+
+
+class CborCodec:
+    """Schema-less binary codec: a subset of CBOR (RFC 8949).
+
+    Covers ints, floats (as float32 when exact), str, bytes, lists, dicts,
+    bools and None, which is all sensor payloads use.
+    """
+    binary = True
+
+    def encode(self, obj):
+        out = bytearray()
+        _cbor_encode(out, obj)
+        return out
+
+    def decode(self, data):
+        return _cbor_decode(data, 0)[0]
+
+
+CBOR = CborCodec()
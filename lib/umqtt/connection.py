@@ -0,0 +1,140 @@
+import asyncio
+import random
+from ticks import ticks_ms, ticks_diff
+
+
+class Backoff:
+    """Jittered exponential backoff for reconnect attempts.
+
+    Attempt n waits a random time between half and all of
+    min(base * 2**n, maximum) seconds, so devices that lost the broker
+    together do not all come back at the same moment.
+    """
+    def __init__(self, base=1, maximum=60):
+        self.base = base
+        self.maximum = maximum
+        self.attempts = 0
+        self.delay = 0
+
+    def next_delay(self):
+        self.delay = min(self.base * (1 << min(self.attempts, 16)), self.maximum) * (0.5 + random.random() / 2)
+        self.attempts += 1
+        return self.delay
+
+    def reset(self):
+        self.attempts = 0
+        self.delay = 0
+
+
+class ConnectionManager:
+    """Task that keeps an AsyncMQTTClient connected.
+
+    While connected it sends PINGREQ every `ping_interval` seconds (half the
+    keepalive by default) and drops the link if the PINGRESP does not come
+    back in time. While disconnected it calls `connect()` (a coroutine
+    function returning True on success) with jittered exponential backoff.
+    Publishers only wait for wait_connected(), so sensor tasks never retry
+    connections themselves.
+    """
+    def __init__(self, client, connect, ping_interval=None, backoff_base=1, backoff_max=60):
+        self.client = client
+        self.connect = connect
+        if ping_interval is None:
+            ping_interval = client.keepalive / 2 if client.keepalive else 0
+        self.ping_interval = ping_interval
+        self.backoff = Backoff(backoff_base, backoff_max)
+        self._up = asyncio.Event()
+        self._task = None
+
+        self.connects = 0
+        self.reconnects = 0
+        self.connect_failures = 0
+        self.pings = 0
+        self.ping_timeouts = 0
+        self._connected_at = None
+        self._uptime_ms_total = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def wait_connected(self, timeout=None):
+        """Wait until the client is connected; returns False on timeout."""
+        if self.client.connected:
+            return True
+        try:
+            await asyncio.wait_for(self._up.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def run(self):
+        client = self.client
+        while True:
+            if not client.connected:
+                self._session_ended()
+                if not await self.connect():
+                    self.connect_failures += 1
+                    await asyncio.sleep(self.backoff.next_delay())
+                    continue
+                self.backoff.reset()
+                self.connects += 1
+                if self.connects > 1:
+                    self.reconnects += 1
+                self._connected_at = ticks_ms()
+                self._up.set()
+            if not await self._wait_closed(self.ping_interval or None):
+                await self._ping()
+
+    async def _wait_closed(self, timeout):
+        # True if the link went down, False when `timeout` seconds passed first
+        try:
+            await asyncio.wait_for(self.client.closed.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _ping(self):
+        self.pings += 1
+        try:
+            ok = await self.client.ping(wait=True)
+        except Exception as e:
+            print(f"MQTT ping failed: {e!r}")
+            ok = False
+        if not ok and self.client.connected:
+            self.ping_timeouts += 1
+            print("MQTT PINGRESP missing, dropping connection")
+            self.client.abort()
+
+    def _session_ended(self):
+        self._up.clear()
+        if self._connected_at is not None:
+            self._uptime_ms_total += ticks_diff(ticks_ms(), self._connected_at)
+            self._connected_at = None
+
+    def uptime_s(self):
+        """Seconds since the current connection was established (0 if down)."""
+        if self._connected_at is None or not self.client.connected:
+            return 0
+        return ticks_diff(ticks_ms(), self._connected_at) // 1000
+
+    def get_stats(self):
+        total = self._uptime_ms_total
+        if self._connected_at is not None and self.client.connected:
+            total += ticks_diff(ticks_ms(), self._connected_at)
+        return {
+            "uptime_s": self.uptime_s(),
+            "connected_s_total": total // 1000,
+            "connects": self.connects,
+            "reconnects": self.reconnects,
+            "connect_failures": self.connect_failures,
+            "backoff_s": round(self.backoff.delay, 1),
+            "pings": self.pings,
+            "ping_timeouts": self.ping_timeouts,
+        }
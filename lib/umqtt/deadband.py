@@ -0,0 +1,77 @@
+from ticks import ticks_ms, ticks_diff
+
+
+class DeadbandFilter:
+    """Decides whether a sensor reading is worth publishing.
+
+    A reading passes when any field moved by at least its deadband since the
+    last reading that passed, or when `max_interval` seconds went by without
+    one (heartbeat). The deadband of a field is the larger of `absolute` and
+    `relative` times the last published value; either may be a single number
+    or one per field. Non-numeric fields pass whenever they change.
+
+    check() only decides; call commit() once the reading was actually
+    published, so one lost to a full queue is not taken as the new baseline.
+    """
+    def __init__(self, absolute=0, relative=0, max_interval=300):
+        self.absolute = absolute
+        self.relative = relative
+        self.max_interval_ms = int(max_interval * 1000)
+        self._last = None
+        self._last_at = 0
+        self._heartbeat = False
+
+        self.passed = 0
+        self.suppressed = 0
+        self.heartbeats = 0
+
+    def _moved(self, values):
+        absolute = self.absolute
+        relative = self.relative
+        for i, value in enumerate(values):
+            last = self._last[i]
+            if value == last:
+                continue
+            if not isinstance(value, (int, float)) or not isinstance(last, (int, float)):
+                return True
+            a = absolute[i] if isinstance(absolute, (tuple, list)) else absolute
+            r = relative[i] if isinstance(relative, (tuple, list)) else relative
+            if abs(value - last) >= max(a, r * abs(last)):
+                return True
+        return False
+
+    def check(self, values):
+        """Return True if the reading should be published."""
+        self._heartbeat = False
+        if self._last is None or len(values) != len(self._last):
+            return True
+        if ticks_diff(ticks_ms(), self._last_at) >= self.max_interval_ms:
+            self._heartbeat = True
+            return True
+        if self._moved(values):
+            return True
+        self.suppressed += 1
+        return False
+
+    def commit(self, values):
+        """Remember `values` as the last published reading."""
+        last = self._last
+        if last is None or len(values) != len(last):
+            self._last = list(values)
+        else:
+            for i, value in enumerate(values):
+                last[i] = value
+        self._last_at = ticks_ms()
+        self.passed += 1
+        if self._heartbeat:
+            self._heartbeat = False
+            self.heartbeats += 1
+
+    def get_stats(self):
+        total = self.passed + self.suppressed
+        return {
+            "passed": self.passed,
+            "suppressed": self.suppressed,
+            "heartbeats": self.heartbeats,
+            "suppressed_pct": self.suppressed * 100 // total if total else 0,
+        }
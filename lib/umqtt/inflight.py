@@ -0,0 +1,73 @@
+from ticks import ticks_ms, ticks_diff
+
+# Packet table entry fields
+_TOPIC = 0
+_MSG = 1
+_RETAIN = 2
+_SENT_AT = 3
+_SEQ = 4
+
+
+class InflightWindow:
+    """Packet-id table of QoS 1 messages sent but not yet acknowledged.
+
+    Shared by MQTTClient and AsyncMQTTClient: up to `size` PUBLISH packets may
+    wait for their PUBACK at once, PUBACKs are matched by packet id in any
+    order, and whatever is still unacknowledged after a reconnect is sent
+    again (pending()) with the DUP flag.
+    """
+    def __init__(self, size):
+        self.size = size
+        self.packets = {}
+        self._seq = 0
+
+        self.sent = 0
+        self.acked = 0
+        self.retransmitted = 0
+        self.unknown_acks = 0
+        self.rtt_ms_max = 0
+        self._rtt_ms_total = 0
+
+    def full(self):
+        return len(self.packets) >= self.size
+
+    def add(self, pid, topic, msg, retain):
+        """Remember a sent packet; the payload is copied so callers may reuse it."""
+        self._seq += 1
+        self.packets[pid] = (topic, bytes(msg), retain, ticks_ms(), self._seq)
+        self.sent += 1
+
+    def discard(self, pid):
+        """Forget a packet whose send failed (the caller will publish it again)."""
+        if self.packets.pop(pid, None) is not None:
+            self.sent -= 1
+
+    def ack(self, pid):
+        """Match a PUBACK; returns False if `pid` was not in flight."""
+        entry = self.packets.pop(pid, None)
+        if entry is None:
+            self.unknown_acks += 1
+            return False
+        rtt = ticks_diff(ticks_ms(), entry[_SENT_AT])
+        self._rtt_ms_total += rtt
+        if rtt > self.rtt_ms_max:
+            self.rtt_ms_max = rtt
+        self.acked += 1
+        return True
+
+    def pending(self):
+        """Unacknowledged packets as (pid, topic, msg, retain), oldest first."""
+        items = sorted(self.packets.items(), key=lambda item: item[1][_SEQ])
+        return [(pid, e[_TOPIC], e[_MSG], e[_RETAIN]) for pid, e in items]
+
+    def get_stats(self):
+        return {
+            "window": self.size,
+            "inflight": len(self.packets),
+            "sent": self.sent,
+            "acked": self.acked,
+            "retransmitted": self.retransmitted,
+            "unknown_acks": self.unknown_acks,
+            "rtt_ms_avg": self._rtt_ms_total // self.acked if self.acked else 0,
+            "rtt_ms_max": self.rtt_ms_max,
+        }
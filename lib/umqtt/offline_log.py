@@ -0,0 +1,161 @@
+import struct
+import time
+
+# File layout: header, then `slots` fixed-size records used as a ring.
+#   header: magic, record size (u16), slots (u16), first unsent sequence number (u32)
+#   record: sequence number (u32, 0 = empty), time.time() (u32), topic length (u8),
+#           flags (u8, bit 0 retain, bit 1 binary payload), payload length (u16), topic, payload, padding
+# A record lives in slot seq % slots, so the ring position is recovered at boot
+# by scanning sequence numbers; only the header changes when records are replayed.
+_MAGIC = b'OLG1'
+_FILE_HEADER = '<4sHHI'
+_FILE_HEADER_SIZE = 12
+_RECORD_HEADER = '<IIBBH'
+_RECORD_HEADER_SIZE = 12
+
+
+class OfflineLog:
+    """Bounded store-and-forward log on flash for readings published while offline.
+
+    Records are collected in RAM and written out `batch_records` at a time (or
+    after `flush_interval` seconds), so flash sees few, larger writes. When the
+    ring is full the oldest unsent record is overwritten.
+    """
+    def __init__(self, path, record_size=128, slots=256, batch_records=16, flush_interval=300):
+        self.path = path
+        self.record_size = record_size
+        self.slots = slots
+        self.flush_interval = flush_interval
+        self._pending = bytearray(batch_records * record_size)
+        self._pending_max = batch_records
+        self._pending_count = 0
+        self._pending_since = 0
+        self.first_seq = 1
+        self.next_seq = 1
+
+        self.stored = 0
+        self.dropped = 0
+        self.oversized = 0
+        self.replayed = 0
+        self.flash_writes = 0
+        self._open()
+
+    def _open(self):
+        try:
+            with open(self.path, 'rb') as f:
+                magic, record_size, slots, first_seq = struct.unpack(_FILE_HEADER, f.read(_FILE_HEADER_SIZE))
+                if magic != _MAGIC or record_size != self.record_size or slots != self.slots:
+                    raise ValueError("Offline log layout changed")
+                last = 0
+                for _ in range(slots):
+                    seq = struct.unpack(_RECORD_HEADER, f.read(record_size)[:_RECORD_HEADER_SIZE])[0]
+                    if seq > last:
+                        last = seq
+            self.next_seq = last + 1
+            self.first_seq = max(first_seq, self.next_seq - slots, 1)
+        except (OSError, ValueError, struct.error):
+            self._create()
+
+    def _create(self):
+        with open(self.path, 'wb') as f:
+            f.write(struct.pack(_FILE_HEADER, _MAGIC, self.record_size, self.slots, 1))
+            empty = bytes(self.record_size)
+            for _ in range(self.slots):
+                f.write(empty)
+        self.first_seq = 1
+        self.next_seq = 1
+
+    def backlog(self):
+        """Number of records waiting to be replayed (including unflushed ones)."""
+        return self.next_seq - self.first_seq
+
+    def append(self, topic, payload, retain=False, binary=False):
+        """Store one reading; returns False if it does not fit in a record."""
+        size = _RECORD_HEADER_SIZE + len(topic) + len(payload)
+        if size > self.record_size or len(topic) > 255:
+            self.oversized += 1
+            return False
+        if self._pending_count == 0:
+            self._pending_since = time.time()
+        pos = self._pending_count * self.record_size
+        struct.pack_into(_RECORD_HEADER, self._pending, pos, self.next_seq, int(time.time()),
+                         len(topic), (1 if retain else 0) | (2 if binary else 0), len(payload))
+        pos += _RECORD_HEADER_SIZE
+        self._pending[pos:pos + len(topic)] = topic
+        pos += len(topic)
+        self._pending[pos:pos + len(payload)] = payload
+        self._pending_count += 1
+        self.next_seq += 1
+        self.stored += 1
+        if self.next_seq - self.first_seq > self.slots:
+            self.first_seq = self.next_seq - self.slots
+            self.dropped += 1
+        if self._pending_count == self._pending_max:
+            self.flush()
+        return True
+
+    def maybe_flush(self):
+        """Flush if the oldest buffered record is older than flush_interval."""
+        if self._pending_count and time.time() - self._pending_since >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        count = self._pending_count
+        if not count:
+            return
+        size = self.record_size
+        first = self.next_seq - count
+        mv = memoryview(self._pending)
+        with open(self.path, 'r+b') as f:
+            done = 0
+            while done < count:
+                slot = (first + done) % self.slots
+                run = min(count - done, self.slots - slot)
+                f.seek(_FILE_HEADER_SIZE + slot * size)
+                f.write(mv[done * size:(done + run) * size])
+                done += run
+        self._pending_count = 0
+        self.flash_writes += 1
+
+    def read_batch(self, n):
+        """Return up to n (seq, timestamp, topic, payload, retain, binary) records, oldest first."""
+        self.flush()
+        records = []
+        size = self.record_size
+        with open(self.path, 'rb') as f:
+            seq = self.first_seq
+            while seq < self.next_seq and len(records) < n:
+                f.seek(_FILE_HEADER_SIZE + (seq % self.slots) * size)
+                data = f.read(size)
+                rec_seq, ts, topic_len, flags, payload_len = struct.unpack_from(_RECORD_HEADER, data, 0)
+                if rec_seq == seq:
+                    pos = _RECORD_HEADER_SIZE + topic_len
+                    records.append((seq, ts, data[_RECORD_HEADER_SIZE:pos], data[pos:pos + payload_len],
+                                    bool(flags & 1), bool(flags & 2)))
+                elif not records:
+                    # Lost before it reached flash (e.g. power cut); skip it
+                    self.first_seq = seq + 1
+                    self.dropped += 1
+                seq += 1
+        return records
+
+    def ack(self, seq):
+        """Mark every record up to `seq` as replayed."""
+        if seq < self.first_seq:
+            return
+        self.replayed += seq + 1 - self.first_seq
+        self.first_seq = seq + 1
+        with open(self.path, 'r+b') as f:
+            f.seek(8)
+            f.write(struct.pack('<I', self.first_seq))
+        self.flash_writes += 1
+
+    def get_stats(self):
+        return {
+            "backlog": self.backlog(),
+            "stored": self.stored,
+            "dropped": self.dropped,
+            "oversized": self.oversized,
+            "replayed": self.replayed,
+            "flash_writes": self.flash_writes,
+        }
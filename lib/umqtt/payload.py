@@ -0,0 +1,24 @@
+import json
+from umqtt.codec import JSON
+
+
+def encode_payload(payload, codec=None):
+    """Return a bytes-like payload for a dict, a str or a binary buffer.
+
+    Dicts are encoded with `codec` (JSON by default); binary buffers
+    (including rendered PayloadTemplates) are passed through untouched.
+    """
+    if isinstance(payload, dict):
+        return (codec or JSON).encode(payload)
+    if isinstance(payload, str):
+        return payload.encode()
+    return payload
+
+
+def describe_payload(payload):
+    """Printable form of a payload for the console log."""
+    if isinstance(payload, dict):
+        return json.dumps(payload)
+    if isinstance(payload, str):
+        return payload
+    return f"<{len(payload)} bytes>"
@@ -1,12 +1,19 @@
 import socket
 import struct
 from binascii import hexlify
+from umqtt.inflight import InflightWindow
 
 
 class MQTTException(Exception):
     pass
 
 class MQTTClient:
+    # Outgoing packets are assembled in a preallocated `tx_size` buffer and sent
+    # with one write (payloads that do not fit follow in a second write).
+    # Incoming bytes are read in bulk into an `rx_size` buffer and parsed from there.
+    # With `inflight` > 0, QoS 1 publishes do not wait for their PUBACK: up to
+    # `inflight` packets may be outstanding, and their PUBACKs are matched by
+    # wait_msg()/check_msg() (see InflightWindow).
     def __init__(
         self,
         client_id,
@@ -17,6 +24,9 @@ class MQTTClient:
         keepalive=0,
         ssl=None,
         ssl_params={},
+        tx_size=256,
+        rx_size=256,
+        inflight=0,
     ):
         if port == 0:
             port = 8883 if ssl else 1883
@@ -35,16 +45,94 @@ class MQTTClient:
         self.lw_msg = None
         self.lw_qos = 0
         self.lw_retain = False
+        self._tx = bytearray(tx_size)
+        self._rx = bytearray(rx_size)
+        self._rx_mv = memoryview(self._rx)
+        self._rx_pos = 0
+        self._rx_end = 0
+        self.inflight = InflightWindow(inflight) if inflight else None
+        self.pingresps = 0
 
-    def _send_str(self, s):
-        self.sock.write(struct.pack("!H", len(s)))
-        self.sock.write(s)
+    def _put_header(self, op, sz):
+        # Fixed header at the start of the tx buffer; returns its length
+        tx = self._tx
+        tx[0] = op
+        i = 1
+        while sz > 0x7F:
+            tx[i] = (sz & 0x7F) | 0x80
+            sz >>= 7
+            i += 1
+        tx[i] = sz
+        return i + 1
+
+    def _put(self, i, data):
+        # Append data at tx[i:], flushing the buffer first if it would overflow
+        n = len(data)
+        if i + n > len(self._tx):
+            if i:
+                self.sock.write(self._tx, i)
+            self.sock.write(data)
+            return 0
+        self._tx[i : i + n] = data
+        return i + n
+
+    def _put_str(self, i, s):
+        if i + 2 > len(self._tx):
+            self.sock.write(self._tx, i)
+            i = 0
+        struct.pack_into("!H", self._tx, i, len(s))
+        return self._put(i + 2, s)
+
+    def _flush(self, i):
+        if i:
+            self.sock.write(self._tx, i)
+
+    def _fill(self):
+        # Read whatever the socket has into the rx buffer; False if nothing (non-blocking)
+        if self._rx_pos == self._rx_end:
+            self._rx_pos = self._rx_end = 0
+        elif self._rx_end == len(self._rx):
+            n = self._rx_end - self._rx_pos
+            self._rx[:n] = self._rx_mv[self._rx_pos : self._rx_end]
+            self._rx_pos = 0
+            self._rx_end = n
+        n = self.sock.readinto(self._rx_mv[self._rx_end :])
+        if n is None:
+            return False
+        if not n:
+            raise OSError(-1)
+        self._rx_end += n
+        return True
+
+    def _read_byte(self):
+        if self._rx_pos == self._rx_end:
+            self._fill()
+        b = self._rx[self._rx_pos]
+        self._rx_pos += 1
+        return b
+
+    def _read_u16(self):
+        return self._read_byte() << 8 | self._read_byte()
+
+    def _read(self, n):
+        avail = self._rx_end - self._rx_pos
+        if n > len(self._rx):
+            # Larger than the buffer: hand over what is buffered, read the rest directly
+            data = bytes(self._rx_mv[self._rx_pos : self._rx_end]) + self.sock.read(n - avail)
+            self._rx_pos = self._rx_end = 0
+            return data
+        while avail < n:
+            self._fill()
+            avail = self._rx_end - self._rx_pos
+        data = bytes(self._rx_mv[self._rx_pos : self._rx_pos + n])
+        self._rx_pos += n
+        return data
 
     def _recv_len(self):
         n = 0
         sh = 0
         while 1:
-            b = self.sock.read(1)[0]
+            b = self._read_byte()
             n |= (b & 0x7F) << sh
             if not b & 0x80:
                 return n
@@ -73,44 +161,42 @@ class MQTTClient:
             self.sock = ssl.wrap_socket(self.sock, **self.ssl_params)
         elif self.ssl:
             self.sock = self.ssl.wrap_socket(self.sock, server_hostname=self.server)
-        premsg = bytearray(b"\x10\0\0\0\0\0")
-        msg = bytearray(b"\x04MQTT\x04\x02\0\0")
+        self._rx_pos = self._rx_end = 0
+        msg = bytearray(b"\0\x04MQTT\x04\x02\0\0")
 
         sz = 10 + 2 + len(self.client_id)
-        msg[6] = clean_session << 1
+        msg[7] = clean_session << 1
         if self.user:
             sz += 2 + len(self.user) + 2 + len(self.pswd)
-            msg[6] |= 0xC0
+            msg[7] |= 0xC0
         if self.keepalive:
             assert self.keepalive < 65536
-            msg[7] |= self.keepalive >> 8
-            msg[8] |= self.keepalive & 0x00FF
+            msg[8] |= self.keepalive >> 8
+            msg[9] |= self.keepalive & 0x00FF
         if self.lw_topic:
             sz += 2 + len(self.lw_topic) + 2 + len(self.lw_msg)
-            msg[6] |= 0x4 | (self.lw_qos & 0x1) << 3 | (self.lw_qos & 0x2) << 3
-            msg[6] |= self.lw_retain << 5
-
-        i = 1
-        while sz > 0x7F:
-            premsg[i] = (sz & 0x7F) | 0x80
-            sz >>= 7
-            i += 1
-        premsg[i] = sz
+            msg[7] |= 0x4 | (self.lw_qos & 0x1) << 3 | (self.lw_qos & 0x2) << 3
+            msg[7] |= self.lw_retain << 5
 
-        self.sock.write(premsg, i + 2)
-        self.sock.write(msg)
+        i = self._put_header(0x10, sz)
+        i = self._put(i, msg)
         # print(hex(len(msg)), hexlify(msg, ":"))
-        self._send_str(self.client_id)
+        i = self._put_str(i, self.client_id)
         if self.lw_topic:
-            self._send_str(self.lw_topic)
-            self._send_str(self.lw_msg)
+            i = self._put_str(i, self.lw_topic)
+            i = self._put_str(i, self.lw_msg)
         if self.user:
-            self._send_str(self.user)
-            self._send_str(self.pswd)
-        resp = self.sock.read(4)
+            i = self._put_str(i, self.user)
+            i = self._put_str(i, self.pswd)
+        self._flush(i)
+        resp = self._read(4)
         assert resp[0] == 0x20 and resp[1] == 0x02
         if resp[3] != 0:
             raise MQTTException(resp[3])
+        if self.inflight:
+            for pid, topic, msg, retain in self.inflight.pending():
+                self._send_publish(topic, msg, retain, 1, pid, 0x08)
+                self.inflight.retransmitted += 1
         return resp[2] & 1
 
     def disconnect(self):
@@ -120,56 +206,67 @@ class MQTTClient:
     def ping(self):
         self.sock.write(b"\xc0\0")
 
-    def publish(self, topic, msg, retain=False, qos=0):
-        pkt = bytearray(b"\x30\0\0\0")
-        pkt[0] |= qos << 1 | retain
+    def _next_pid(self):
+        self.pid = self.pid % 65535 + 1
+        if self.inflight:
+            while self.pid in self.inflight.packets:
+                self.pid = self.pid % 65535 + 1
+        return self.pid
+
+    def _send_publish(self, topic, msg, retain, qos, pid, dup=0):
         sz = 2 + len(topic) + len(msg)
         if qos > 0:
             sz += 2
         assert sz < 2097152
-        i = 1
-        while sz > 0x7F:
-            pkt[i] = (sz & 0x7F) | 0x80
-            sz >>= 7
-            i += 1
-        pkt[i] = sz
-        # print(hex(len(pkt)), hexlify(pkt, ":"))
-        self.sock.write(pkt, i + 1)
-        self._send_str(topic)
+        i = self._put_header(0x30 | dup | qos << 1 | retain, sz)
+        i = self._put_str(i, topic)
+        if qos > 0:
+            if i + 2 > len(self._tx):
+                self._flush(i)
+                i = 0
+            struct.pack_into("!H", self._tx, i, pid)
+            i += 2
+        self._flush(self._put(i, msg))
+
+    # Returns the packet id of a QoS 1 message. With an in-flight window it
+    # returns as soon as the packet is written (waiting only while the window
+    # is full); otherwise it waits for the PUBACK.
+    def publish(self, topic, msg, retain=False, qos=0):
+        pid = None
         if qos > 0:
-            self.pid += 1
-            pid = self.pid
-            struct.pack_into("!H", pkt, 0, pid)
-            self.sock.write(pkt, 2)
-        self.sock.write(msg)
+            if qos == 1 and self.inflight:
+                while self.inflight.full():
+                    self.wait_msg()
+            pid = self._next_pid()
+        self._send_publish(topic, msg, retain, qos, pid)
+        if qos == 1 and self.inflight:
+            self.inflight.add(pid, topic, msg, retain)
+            return pid
         if qos == 1:
             while 1:
                 op = self.wait_msg()
                 if op == 0x40:
-                    sz = self.sock.read(1)
-                    assert sz == b"\x02"
-                    rcv_pid = self.sock.read(2)
-                    rcv_pid = rcv_pid[0] << 8 | rcv_pid[1]
+                    sz = self._read_byte()
+                    assert sz == 2
+                    rcv_pid = self._read_u16()
                     if pid == rcv_pid:
-                        return
+                        return pid
         elif qos == 2:
             assert 0
 
     def subscribe(self, topic, qos=0):
         assert self.cb is not None, "Subscribe callback is not set"
-        pkt = bytearray(b"\x82\0\0\0")
-        self.pid += 1
-        struct.pack_into("!BH", pkt, 1, 2 + 2 + len(topic) + 1, self.pid)
-        # print(hex(len(pkt)), hexlify(pkt, ":"))
-        self.sock.write(pkt)
-        self._send_str(topic)
-        self.sock.write(qos.to_bytes(1, "little"))
+        pid = self._next_pid()
+        i = self._put_header(0x82, 2 + 2 + len(topic) + 1)
+        struct.pack_into("!H", self._tx, i, pid)
+        i = self._put_str(i + 2, topic)
+        self._flush(self._put(i, qos.to_bytes(1, "little")))
         while 1:
             op = self.wait_msg()
             if op == 0x90:
-                resp = self.sock.read(4)
+                resp = self._read(4)
                 # print(resp)
-                assert resp[1] == pkt[2] and resp[2] == pkt[3]
+                assert resp[1] << 8 | resp[2] == pid
                 if resp[3] == 0x80:
                     raise MQTTException(resp[3])
                 return
@@ -179,38 +276,48 @@ class MQTTClient:
     # set by .set_callback() method. Other (internal) MQTT
     # messages processed internally.
     def wait_msg(self):
-        res = self.sock.read(1)
-        self.sock.setblocking(True)
-        if res is None:
+        if self._rx_pos == self._rx_end and not self._fill():
+            self.sock.setblocking(True)
             return None
-        if res == b"":
-            raise OSError(-1)
-        if res == b"\xd0":  # PINGRESP
-            sz = self.sock.read(1)[0]
+        self.sock.setblocking(True)
+        op = self._read_byte()
+        if op == 0xD0:  # PINGRESP
+            sz = self._read_byte()
             assert sz == 0
+            self.pingresps += 1
             return None
-        op = res[0]
+        if op == 0x40 and self.inflight:  # PUBACK for the in-flight window
+            sz = self._read_byte()
+            assert sz == 2
+            self.inflight.ack(self._read_u16())
+            return op
         if op & 0xF0 != 0x30:
             return op
         sz = self._recv_len()
-        topic_len = self.sock.read(2)
-        topic_len = (topic_len[0] << 8) | topic_len[1]
-        topic = self.sock.read(topic_len)
+        topic_len = self._read_u16()
+        topic = self._read(topic_len)
         sz -= topic_len + 2
         if op & 6:
-            pid = self.sock.read(2)
-            pid = pid[0] << 8 | pid[1]
+            pid = self._read_u16()
             sz -= 2
-        msg = self.sock.read(sz)
+        msg = self._read(sz)
         self.cb(topic, msg)
         if op & 6 == 2:
-            pkt = bytearray(b"\x40\x02\0\0")
-            struct.pack_into("!H", pkt, 2, pid)
-            self.sock.write(pkt)
+            i = self._put_header(0x40, 2)
+            struct.pack_into("!H", self._tx, i, pid)
+            self._flush(i + 2)
         elif op & 6 == 4:
             assert 0
         return op
 
+    # Process incoming messages until every in-flight QoS 1 message is acknowledged.
+    def wait_inflight(self):
+        while self.inflight is not None and self.inflight.packets:
+            self.wait_msg()
+
+    def get_stats(self):
+        return self.inflight.get_stats() if self.inflight is not None else None
+
     # Checks whether a pending message from server is available.
     # If not, returns immediately with None. Otherwise, does
     # the same processing as wait_msg.
@@ -0,0 +1,143 @@
+# Room reserved per numeric field: sign, 19 digits, point and a few decimals
+_NUMBER_SIZE = 24
+
+_LITERAL = 0
+_INT = 1
+_FIXED = 2
+_TEXT = 3
+
+
+def _put_int(buf, pos, value):
+    """Write the decimal digits of int `value` at `pos`, return the new position."""
+    if value < 0:
+        buf[pos] = 45  # '-'
+        pos += 1
+        value = -value
+    start = pos
+    while True:
+        buf[pos] = 48 + value % 10
+        value //= 10
+        pos += 1
+        if not value:
+            break
+    i = start
+    j = pos - 1
+    while i < j:
+        buf[i], buf[j] = buf[j], buf[i]
+        i += 1
+        j -= 1
+    return pos
+
+
+def _put_digits(buf, pos, value, width):
+    """Write `value` zero-padded to `width` digits."""
+    end = pos + width
+    while width:
+        width -= 1
+        buf[pos + width] = 48 + value % 10
+        value //= 10
+    return end
+
+
+class PayloadTemplate:
+    """Payload compiled once from a %-style template and rendered into one reusable buffer.
+
+    Fields are %d (int), %.Nf (number with N decimals), %s (bytes, e.g. a
+    pre-encoded status string) and %% for a literal percent sign:
+
+        t = PayloadTemplate('{"temperature":%d,"humidity":%d}')
+        t.render((21, 40))  # memoryview of b'{"temperature":21,"humidity":40}'
+
+    The returned view is overwritten by the next render(), so it must be sent
+    (or copied) before rendering again. %s values longer than `text_size`
+    raise ValueError.
+    """
+    binary = False
+
+    def __init__(self, template, text_size=32):
+        if isinstance(template, str):
+            template = template.encode()
+        self.text_size = text_size
+        self.fields = 0
+        self._ops = []
+        size = 0
+        literal = bytearray()
+        i = 0
+        n = len(template)
+        while i < n:
+            c = template[i]
+            if c != 37 or i + 1 == n:  # not '%'
+                literal.append(c)
+                i += 1
+                continue
+            spec = template[i + 1]
+            if spec == 37:
+                literal.append(37)
+                i += 2
+                continue
+            if literal:
+                self._ops.append((_LITERAL, bytes(literal)))
+                size += len(literal)
+                literal = bytearray()
+            if spec == 100:  # 'd'
+                self._ops.append((_INT, 0))
+                size += _NUMBER_SIZE
+                i += 2
+            elif spec == 115:  # 's'
+                self._ops.append((_TEXT, 0))
+                size += text_size
+                i += 2
+            elif spec == 46 and i + 3 < n and template[i + 3] == 102:  # '.Nf'
+                self._ops.append((_FIXED, template[i + 2] - 48))
+                size += _NUMBER_SIZE
+                i += 4
+            else:
+                raise ValueError("Unsupported template field at %d" % i)
+            self.fields += 1
+        if literal:
+            self._ops.append((_LITERAL, bytes(literal)))
+            size += len(literal)
+        self._ops = tuple(self._ops)
+        self._size = size
+        self._buf = bytearray(size)
+        self._mv = memoryview(self._buf)
+        self.length = 0
+
+    def render(self, values):
+        """Render `values` (one per field, in order) and return a view of the payload."""
+        buf = self._buf
+        pos = 0
+        field = 0
+        for kind, arg in self._ops:
+            if kind == _LITERAL:
+                end = pos + len(arg)
+                if end > self._size:
+                    raise ValueError("Payload does not fit the template buffer")
+                buf[pos:end] = arg
+                pos = end
+                continue
+            value = values[field]
+            field += 1
+            if kind == _INT:
+                pos = _put_int(buf, pos, int(value))
+            elif kind == _FIXED:
+                scale = 10 ** arg
+                scaled = int(round(value * scale))
+                if scaled < 0:
+                    buf[pos] = 45
+                    pos += 1
+                    scaled = -scaled
+                pos = _put_int(buf, pos, scaled // scale)
+                if arg:
+                    buf[pos] = 46  # '.'
+                    pos = _put_digits(buf, pos + 1, scaled % scale, arg)
+            else:
+                if isinstance(value, str):
+                    value = value.encode()
+                end = pos + len(value)
+                if len(value) > self.text_size or end > self._size:
+                    raise ValueError("Template text field too long")
+                buf[pos:end] = value
+                pos = end
+        self.length = pos
+        return self._mv[:pos]
@@ -1,10 +1,17 @@
 import asyncio
 import os
-import time
 import dht
-from machine import Pin, Timer, UART
-from umqtt.MqttPublisher import MqttPublisher
-from ld2410.ld2410 import LD2410
+import machine
+import ubinascii
+from machine import Pin, UART
+from umqtt.AsyncMqttPublisher import AsyncMqttPublisher
+from umqtt.offline_log import OfflineLog
+from umqtt.SensorPublisher import SensorPublisher
+from umqtt.deadband import DeadbandFilter
+from ld2410.ld2410 import AsyncLD2410
+from ld2410.stream import EngineeringStream
+from ld2410.manager import RadarManager
+from ld2410.calibration import calibrate, save_profile, load_profile
 from ota.ota import OTAUpdater
 from microdot import Microdot, Response
 from modules.wifi_support import WiFiManager
@@ -12,7 +19,13 @@ from modules.html_template import SUCCESS_HTML,CONFIG_HTML,STATUS_HTML,CONTROL_H
 from modules.rgb_led_module import RGBLEDController
 from modules.pir_motion_sensor import PIRSensor
 from modules.photocell_monitor import PhotocellSensor
-from modules.ha_connection import update_state_entity
+from modules.ha_connection import HA_AUTH, HOME_ASSISTANT_URL
+from modules.ha_client import HAClient
+from modules.ha_state_sync import EntityStateSync
+from modules.ha_discovery import HADiscovery
+from modules.occupancy import OccupancyEngine
+from modules.rules import RulesEngine
+from modules.payload_schemas import mmwave_state_codec
 # Initialize Microdot app (async version)
 app = Microdot()
 
@@ -26,76 +39,221 @@ MQTT_PORT = 1883
 MQTT_USER = "System"
 MQTT_PASSWORD = "@N1w4t0r1"
 MQTT_TOPIC = b"pico/sensor/temperaturenhumidity"
+BRIGHTNESS_TOPIC = "pico/sensor/brightnessdetector"
+MMWAVE_STATE_TOPIC = "pico/sensor/mmWavesensor/state"
+PIR_STATE_TOPIC = "pico/sensor/pir/state"
+# Fused room state from PIR, mmWave and lux; published only when it flips
+OCCUPANCY_TOPIC = "pico/sensor/occupancy/state"
+OCCUPANCY_TEMPLATE = '{"occupancy":"%s","confidence":%d,"source":"%s"}'
+# Readings are only published when they move by the deadband, or every max_interval seconds
+# DHT11 reports whole degrees/percent; humidity jitters by one
+CLIMATE_FILTER = DeadbandFilter(absolute=(1, 2), max_interval=600)
+# Lux jitters by a few units; publish once it moved by both 5 lx and 10% (whichever is larger)
+BRIGHTNESS_FILTER = DeadbandFilter(absolute=5, relative=0.1, max_interval=300)
+# Retained "online"/"offline" (birth message / last will) for Home Assistant
+AVAILABILITY_TOPIC = "pico/sensor/status"
+# Home Assistant REST calls (motion input_boolean) go through one keep-alive connection
+ha_client = HAClient(HOME_ASSISTANT_URL, HA_AUTH)
+# Only the latest desired entity state is sent, at most one request per entity every 2 s
+ha_sync = EntityStateSync(ha_client, min_interval=2, retry_delay=10)
 # --------- Set up MQTT ---------
 MQTT_CONFIG={
     'user':MQTT_USER,
     'password':MQTT_PASSWORD,
     'broker':MQTT_BROKER,
-    'port':MQTT_PORT
+    'port':MQTT_PORT,
+    # QoS 1 messages awaiting PUBACK at once
+    'inflight':8
     }
+# Readings published while the broker is down are kept here and replayed later
+MQTT_OFFLINE_LOG = "mqtt_offline.log"
 # --------- Set up DHT11 Sensor ---------
 sensor = dht.DHT11(Pin(17))
 
-# --------- Set up mmWave (ld2410) Sensor ---------
-TX_PIN = 4  # Example GPIO4 (TX)
-RX_PIN = 5  # Example GPIO5 (RX)
+# --------- Set up mmWave (ld2410) Sensors ---------
+# (name, UART id, TX pin, RX pin) per radar, all covering the same zone
+MMWAVE_RADARS = (
+    ("radar1", 1, 4, 5),
+    # ("radar2", 0, 0, 1),
+)
+# 'any': presence when any radar sees a target, 'all': only when every radar does
+MMWAVE_MERGE = "any"
 
-uart = UART(1, baudrate=256000, tx=Pin(TX_PIN), rx=Pin(RX_PIN))
-mmWave_sensor=LD2410(uart)
+# Radar configuration; per-gate "moving_sensitivity"/"stationary_sensitivity" lists can be added
+MMWAVE_PROFILE = {
+    "max_moving_gate": 5,
+    "max_stationary_gate": 8,
+    "inactivity_time": 15,
+}
+# Per-radar gate thresholds learned by /calibrate, restored at boot
+MMWAVE_CALIBRATION_FILE = "ld2410_{}.json"
+# Stream per-gate energies (engineering mode) in binary batches of N frames; 0 disables
+MMWAVE_STREAM_FRAMES = 20
+# State payload: zone presence and status, then one object per radar
+MMWAVE_STATUS = (b'No target detected', b'Stationary target detected', b'Moving target detected', b'Both stationary and moving')
+MMWAVE_RADAR_TEMPLATE = '"{}":{{"current_status":"%s","moving_dist":%d,"moving_energy":%d,"stat_dist":%d,"detect_dist":%d}}'
+MMWAVE_STATE_TEMPLATE = ('{"is_presence":"%s","attributes":{"current_status":"%s","radars":{'
+                         + ','.join(MMWAVE_RADAR_TEMPLATE.format(radar[0]) for radar in MMWAVE_RADARS)
+                         + '}}}')
+# Send the state as an 11-byte StructCodec record per radar instead of JSON
+# (decode with tools/payload_decoder.py; Home Assistant cannot read it)
+MMWAVE_STATE_BINARY = False
 
-print("Initializing LD2410...")
-mmWave_sensor.enable_config()
-time.sleep(1)
-mmWave_sensor.set_max_values(moving_gate=5, stationary_gate=8, inactivity_time=15)
+# One task polls every radar; rxbuf holds ~20 ms of traffic at 256000 baud between polls
+radar_manager = RadarManager(poll_ms=10, merge=MMWAVE_MERGE)
+mmWave_streams = {}
+for name, uart_id, tx_pin, rx_pin in MMWAVE_RADARS:
+    uart = UART(uart_id, baudrate=256000, tx=Pin(tx_pin), rx=Pin(rx_pin), rxbuf=512)
+    radar = radar_manager.add(name, AsyncLD2410(uart))
+    radar.set_state_filter(debounce_ms=300, release_ms=2000)
+    if MMWAVE_STREAM_FRAMES:
+        mmWave_streams[name] = EngineeringStream(radar, MMWAVE_STREAM_FRAMES)
 
-time.sleep(0.5)
-mmWave_sensor.disable_config()  # Exit configuration mode
+# PIR edges and moving targets mark the room occupied, stationary targets above this energy hold it
+occupancy = OccupancyEngine(radar_energy=lambda: max(radar.stationary_energy for radar in radar_manager.radars.values()),
+                            pir_hold=60, radar_hold=30, lux_hold=30, stationary_energy=20)
+
+# Local automations, compiled at boot from RULES_FILE on flash. Facts: motion, presence,
+# occupied, lux, temperature, humidity. Actions: see RULE_ACTIONS below.
+RULES_FILE = "rules.json"
+# Used when RULES_FILE is missing: motion runs the LED show and mirrors it to Home Assistant
+DEFAULT_RULES = [{
+    "name": "motion",
+    "when": [["motion", "==", True]],
+    "then": [["rgb_show", 2], ["ha_switch", "input_boolean.mobile_motion_sensor", True]],
+    "else": [["rgb_stop"], ["ha_switch", "input_boolean.mobile_motion_sensor", False]],
+}]
+
+def rgb_show(sleep_time=2):
+    if rgb_controller.is_running is False:
+        rgb_controller.rgb_task = asyncio.create_task(rgb_controller.run_rgb_led(sleep_time=sleep_time))
+
+def rgb_stop():
+    if rgb_controller.rgb_task is not None:
+        rgb_controller.rgb_task.cancel()
+        rgb_controller.rgb_task = None
+
+def rule_publish(topic, payload):
+    if mqtt is not None:
+        asyncio.create_task(mqtt.publish(topic, payload))
+
+RULE_ACTIONS = {
+    "rgb_show": rgb_show,
+    "rgb_stop": rgb_stop,
+    "ha_switch": lambda entity_id, on: ha_sync.set_switch(entity_id, on),
+    "publish": rule_publish,
+}
+rules = RulesEngine(RULE_ACTIONS)
+
+def on_zone_change(zone, previous):
+    occupancy.radar(zone)
+    rules.update("presence", zone > 0)
+radar_manager.on_zone_change = on_zone_change
 
 # Create instance
 wifi_manager = WiFiManager()
+# MQTT publisher, created once Wi-Fi is up
+mqtt = None
+pir_sensor = None
+
+# Configure mmWave sensors without blocking the other tasks.
+# Only values that differ from each radar's current settings are sent.
+async def setup_mmWave_sensor():
+    print("Initializing LD2410...")
+    radar_manager.start()
+    for name, radar in radar_manager.radars.items():
+        profile = dict(MMWAVE_PROFILE, engineering_mode=bool(mmWave_streams))
+        calibrated = load_profile(MMWAVE_CALIBRATION_FILE.format(name))
+        if calibrated:
+            profile.update(calibrated)
+        if not await radar.apply_profile(profile):
+            print(f"LD2410 {name}: failed to apply configuration profile")
+            continue
+        print(f"LD2410 {name} configured ({radar.profile_changes} changes)")
 
 # Start mmWave sensor
-async def run_mmWave_sensor(mqtt,interval=15):
+# Zone presence transitions are published as soon as a radar reports them;
+# the full state of every radar is only re-sent as a heartbeat.
+async def run_mmWave_sensor(mqtt,heartbeat=60):
+    # Presence transitions overtake queued brightness/climate readings and are sent with QoS 1
+    if MMWAVE_STATE_BINARY:
+        payload = mmwave_state_codec([radar[0] for radar in MMWAVE_RADARS])
+        presence, status = (0, 1), (0, 1, 2, 3)
+    else:
+        payload = MMWAVE_STATE_TEMPLATE
+        presence, status = (b'off', b'on'), MMWAVE_STATUS
+    publisher = SensorPublisher(mqtt, MMWAVE_STATE_TOPIC, payload, retain=True, qos=1, priority=2)
+    values = [None] * publisher.template.fields
     while True:
         try:
-            mmWave_sensor.update()  # Update sensor data
-            target_data = mmWave_sensor.get_target_data()  # Get target data
-            state, moving_dist, moving_energy, stat_dist, stat_energy, detect_dist = target_data
-            is_presence = 'on' if state > 0 else 'off'
-            inteprete_state =['No target detected', 'Stationary target detected', 'Moving target detected', 'Both stationary and moving']
-            mqtt.publish("pico/sensor/mmWavesensor/state", {
-                "is_presence": is_presence,
-                "attributes": {
-                    "current_status": inteprete_state[state],
-                    "moving_dist": moving_dist,
-                    "moving_energy": moving_energy,
-                    "stat_dist": stat_dist,
-                    "detect_dist": detect_dist
-                    }
-            })
+            await asyncio.wait_for(radar_manager.wait_zone_change(), heartbeat)
+        except asyncio.TimeoutError:
+            pass
+        try:
+            state = radar_manager.zone_state
+            values[0] = presence[1 if state > 0 else 0]
+            values[1] = status[state]
+            i = 2
+            for radar in radar_manager.radars.values():
+                values[i] = status[radar.presence_state]
+                values[i + 1] = radar.moving_distance
+                values[i + 2] = radar.moving_energy
+                values[i + 3] = radar.stationary_distance
+                values[i + 4] = radar.detection_distance
+                i += 5
+            await publisher.publish_values(values)
         except OSError as e:
             print("Sensor error:", e)
-            
-        await asyncio.sleep(interval)
         
+# Learn gate thresholds from an empty room and keep them for the next boot
+async def calibrate_mmWave_sensor(name, duration=30):
+    print(f"LD2410 {name}: calibrating for {duration} s, keep the room empty")
+    profile = await calibrate(radar_manager.get(name), duration, engineering_mode=bool(mmWave_streams))
+    if profile:
+        save_profile(MMWAVE_CALIBRATION_FILE.format(name), profile)
+        print(f"LD2410 {name} calibrated: {profile}")
+
+# Publish the fused room state whenever it flips between occupied and clear
+async def run_occupancy(mqtt):
+    publisher = SensorPublisher(mqtt, OCCUPANCY_TOPIC, OCCUPANCY_TEMPLATE, retain=True, qos=1, priority=2)
+    def on_change(occupied, confidence, source):
+        rules.update("occupied", occupied)
+        asyncio.create_task(publisher.publish(b'on' if occupied else b'off', confidence, source))
+    occupancy.on_change = on_change
+    await occupancy.run()
+
+# Publish LD2410 parser health counters
+async def publish_mmWave_diagnostics(mqtt,interval=300):
+    while True:
+        await asyncio.sleep(interval)
+        await mqtt.publish("pico/sensor/mmWavesensor/diagnostics", radar_manager.get_stats())
+
 #Publish DHT11 Data
 async def pushlishing_temp_humid_mqtt(mqtt,interval=30):
+    publisher = SensorPublisher(mqtt, MQTT_TOPIC, '{"temperature":%d,"humidity":%d}', retain=True,
+                                filter=CLIMATE_FILTER)
     while True:
         try:
             sensor.measure()
             temp = sensor.temperature()
             hum = sensor.humidity()
-            mqtt.publish("pico/sensor/temperaturenhumidity", {
-                "temperature": temp,
-                "humidity": hum
-            })
+            rules.update("temperature", temp)
+            rules.update("humidity", hum)
+            await publisher.publish(temp, hum)
         except OSError as e:
             print("Sensor error:", e)
             
         await asyncio.sleep(interval)
 # Start PIR sensor
-async def start_pir_sensor():
-    sensor = PIRSensor(pir_pin=16)
+async def start_pir_sensor(mqtt):
+    global pir_sensor
+    publisher = SensorPublisher(mqtt, PIR_STATE_TOPIC, '%s', retain=True, qos=1, priority=2)
+    def on_change(motion):
+        occupancy.pir(motion)
+        rules.update("motion", motion)
+        asyncio.create_task(publisher.publish(b'ON' if motion else b'OFF'))
+    # LED show and the Home Assistant input_boolean are driven by the rules engine
+    sensor = pir_sensor = PIRSensor(pir_pin=16, on_change=on_change)
     
     # Activate the sensor
     task = asyncio.create_task(sensor.activate_pir())
@@ -111,18 +269,77 @@ async def start_pir_sensor():
 
 async def update_area_brightness_to_HA(mqtt,interval=5):
     sensor = PhotocellSensor(adc_pin=26, fixed_resistor=10000,voltage=5)            
-    
+    publisher = SensorPublisher(mqtt, BRIGHTNESS_TOPIC, '{"brightness":%d}', retain=True, filter=BRIGHTNESS_FILTER)
     while True:
         try:
             lux=sensor.get_lux_value()
-            print("Current brightness:",lux)
-            mqtt.publish("pico/sensor/brightnessdetector", {
-                "brightness": lux,
-            })
+            occupancy.lux(lux)
+            rules.update("lux", lux)
+            await publisher.publish(lux)
         except OSError as e:
             print("Sensor error:", e)
         await asyncio.sleep(interval)    
     
+# Home Assistant MQTT discovery: one retained config per entity, republished only when it changes
+def setup_ha_discovery(mqtt):
+    node_id = ubinascii.hexlify(machine.unique_id()).decode()
+    discovery = HADiscovery(mqtt, node_id, {
+        "identifiers": [node_id],
+        "name": "Pico Mobile Sensor",
+        "manufacturer": "Raspberry Pi",
+        "model": "Pico W",
+    })
+    discovery.add("sensor", "temperature", {
+        "name": "Temperature",
+        "device_class": "temperature",
+        "unit_of_measurement": "°C",
+        "state_topic": MQTT_TOPIC.decode(),
+        "value_template": "{{ value_json.temperature }}",
+    })
+    discovery.add("sensor", "humidity", {
+        "name": "Humidity",
+        "device_class": "humidity",
+        "unit_of_measurement": "%",
+        "state_topic": MQTT_TOPIC.decode(),
+        "value_template": "{{ value_json.humidity }}",
+    })
+    discovery.add("sensor", "illuminance", {
+        "name": "Illuminance",
+        "device_class": "illuminance",
+        "unit_of_measurement": "lx",
+        "state_topic": BRIGHTNESS_TOPIC,
+        "value_template": "{{ value_json.brightness }}",
+    })
+    if not MMWAVE_STATE_BINARY:
+        discovery.add("binary_sensor", "mmwave_presence", {
+            "name": "mmWave presence",
+            "device_class": "occupancy",
+            "state_topic": MMWAVE_STATE_TOPIC,
+            "value_template": "{{ value_json.is_presence }}",
+            "payload_on": "on",
+            "payload_off": "off",
+            "json_attributes_topic": MMWAVE_STATE_TOPIC,
+            "json_attributes_template": "{{ value_json.attributes | tojson }}",
+        })
+    else:
+        # Binary state payloads cannot be parsed by Home Assistant
+        discovery.remove("binary_sensor", "mmwave_presence")
+    discovery.add("binary_sensor", "occupancy", {
+        "name": "Occupancy",
+        "device_class": "occupancy",
+        "state_topic": OCCUPANCY_TOPIC,
+        "value_template": "{{ value_json.occupancy }}",
+        "payload_on": "on",
+        "payload_off": "off",
+        "json_attributes_topic": OCCUPANCY_TOPIC,
+    })
+    discovery.add("binary_sensor", "motion", {
+        "name": "Motion",
+        "device_class": "motion",
+        "state_topic": PIR_STATE_TOPIC,
+    })
+    return discovery
+
 # Web routes (now async)
 @app.route('/')
 async def index(request):
@@ -234,6 +451,33 @@ async def status(request):
         return Response(body=status_html, headers={'Content-Type': 'text/html'})
     return Response(status=404)
 
+@app.route('/calibrate')
+async def calibrate_page(request):
+    name = request.args.get('radar', MMWAVE_RADARS[0][0])
+    try:
+        duration = int(request.args.get('duration', 30))
+    except ValueError:
+        return Response(status=400)
+    if duration <= 0:
+        return Response(status=400)
+    if name not in radar_manager.radars:
+        return Response(status=404)
+    asyncio.create_task(calibrate_mmWave_sensor(name, duration))
+    return Response(body=f"Calibrating {name} for {duration} s. Please leave the room.")
+
+@app.route('/diagnostics')
+async def diagnostics(request):
+    return Response(body={
+        "mmWave": radar_manager.get_stats(),
+        "mqtt": mqtt.get_stats() if mqtt else None,
+        "pir": pir_sensor.get_stats() if pir_sensor else None,
+        "occupancy": occupancy.get_stats(),
+        "rules": rules.get_stats(),
+        "ha": ha_client.get_stats(),
+        "ha_sync": ha_sync.get_stats(),
+        "filters": {"climate": CLIMATE_FILTER.get_stats(), "brightness": BRIGHTNESS_FILTER.get_stats()},
+    })
+
 @app.route('/success')
 async def success(request):
     if wifi_manager.connected_to_wifi:
@@ -250,9 +494,12 @@ async def success(request):
 
 
 async def main():
+    global mqtt
     try:
         # Start LED blinking task
         asyncio.create_task(wifi_manager.led_blink_task())
+        asyncio.create_task(setup_mmWave_sensor())
+        print(f"{rules.load(RULES_FILE, DEFAULT_RULES)} automation rule(s) loaded")
         
         # Try to load existing Wi-Fi configuration
         wifi_config = wifi_manager.load_wifi_config()
@@ -275,13 +522,28 @@ async def main():
                         print('Removing to_be_update file...')
                         os.remove('to_be_updated.txt')
                 
+                #Sync the clock so offline readings get real timestamps
+                try:
+                    import ntptime
+                    ntptime.settime()
+                except Exception as e:
+                    print(f"NTP sync failed: {e}")
                 #Set up mqtt connection
-                mqtt = MqttPublisher(MQTT_CONFIG)
+                mqtt = AsyncMqttPublisher(MQTT_CONFIG, offline_log=OfflineLog(MQTT_OFFLINE_LOG))
+                mqtt.set_availability(AVAILABILITY_TOPIC)
+                mqtt.start()
+                asyncio.create_task(setup_ha_discovery(mqtt).run())
                 print("Starting success page server...")
-                asyncio.create_task(start_pir_sensor())
+                ha_client.start()
+                ha_sync.start()
+                asyncio.create_task(start_pir_sensor(mqtt))
                 asyncio.create_task(update_area_brightness_to_HA(mqtt,interval=10))
                 asyncio.create_task(pushlishing_temp_humid_mqtt(mqtt,interval=30))
-                asyncio.create_task(run_mmWave_sensor(mqtt,interval=5))
+                asyncio.create_task(run_mmWave_sensor(mqtt,heartbeat=60))
+                asyncio.create_task(run_occupancy(mqtt))
+                asyncio.create_task(publish_mmWave_diagnostics(mqtt,interval=300))
+                for name, stream in mmWave_streams.items():
+                    asyncio.create_task(stream.run(mqtt, f"pico/sensor/mmWavesensor/{name}/engineering"))
                 await app.run(port=80)
                 return
         
@@ -0,0 +1,200 @@
+import asyncio
+import json
+from ticks import ticks_ms, ticks_diff
+
+
+class HAClient:
+    """Home Assistant REST API client on one keep-alive HTTP/1.1 connection.
+
+    call_service() and set_state() only queue the request and return, so a
+    motion edge never waits on the network. A background task (start())
+    sends queued requests one at a time over a persistent connection and
+    reopens it when Home Assistant closed it in the meantime. Failed
+    requests are logged and counted, not retried.
+
+        ha = HAClient("http://192.168.86.52:8123/api", "Bearer <token>")
+        ha.start()
+        ha.call_service("input_boolean", "turn_on", "input_boolean.mobile_motion_sensor")
+    """
+    def __init__(self, url, auth, max_queue=16, timeout=5, verbose=False):
+        if not url.startswith("http://"):
+            raise ValueError("Only http:// URLs are supported")
+        netloc, _, path = url[7:].partition("/")
+        host, _, port = netloc.partition(":")
+        self.host = host
+        self.port = int(port) if port else 80
+        self.prefix = ("/" + path).rstrip("/").encode()
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.verbose = verbose
+        self._headers = ("Host: %s\r\nAuthorization: %s\r\nContent-Type: application/json\r\n"
+                         "Connection: keep-alive\r\n" % (netloc, auth)).encode()
+        self._queue = []
+        self._wake = asyncio.Event()
+        self._reader = None
+        self._writer = None
+        self._task = None
+
+        self.queued = 0
+        self.dropped = 0
+        self.sent = 0
+        self.failed = 0
+        self.http_errors = 0
+        self.connects = 0
+        self.retries = 0
+        self._latency_ms_total = 0
+        self.latency_ms_max = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._close()
+
+    def call_service(self, domain, service, entity_id, done=None):
+        """Queue POST /services/<domain>/<service> for `entity_id`."""
+        return self.request(f"/services/{domain}/{service}", {"entity_id": entity_id}, done)
+
+    def set_state(self, entity_id, data, done=None):
+        """Queue POST /states/<entity_id>; `data` holds "state" and optional "attributes"."""
+        return self.request(f"/states/{entity_id}", data, done)
+
+    def request(self, path, payload, done=None):
+        """Queue a POST of `payload` (dict) to `path` below the API URL.
+
+        `done(ok)` is called once the request succeeded or failed (or was
+        dropped). When the queue is full the oldest request is dropped to
+        make room.
+        """
+        if len(self._queue) >= self.max_queue:
+            dropped = self._queue.pop(0)
+            self.dropped += 1
+            print(f"HA queue full, dropped {dropped[0].decode()}")
+            if dropped[2] is not None:
+                dropped[2](False)
+        self._queue.append((path.encode(), json.dumps(payload).encode(), done))
+        self.queued += 1
+        self._wake.set()
+        return True
+
+    def pending(self):
+        return len(self._queue)
+
+    async def run(self):
+        while True:
+            if not self._queue:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            path, body, done = self._queue.pop(0)
+            ok = await self._send(path, body)
+            if done is not None:
+                done(ok)
+
+    async def _send(self, path, body):
+        request = b"".join((b"POST ", self.prefix, path, b" HTTP/1.1\r\n", self._headers,
+                            b"Content-Length: ", str(len(body)).encode(), b"\r\n\r\n", body))
+        started = ticks_ms()
+        reused = self._writer is not None
+        try:
+            try:
+                status, reply = await asyncio.wait_for(self._exchange(request), self.timeout)
+            except asyncio.TimeoutError:
+                raise
+            except (EOFError, OSError):
+                # The kept-alive connection was closed before it answered; try a fresh one
+                self._close()
+                if not reused:
+                    raise
+                self.retries += 1
+                status, reply = await asyncio.wait_for(self._exchange(request), self.timeout)
+        except Exception as e:
+            self._close()
+            self.failed += 1
+            print(f"HA request {path.decode()} failed: {e!r}")
+            return False
+        latency = ticks_diff(ticks_ms(), started)
+        self.sent += 1
+        self._latency_ms_total += latency
+        self.latency_ms_max = max(self.latency_ms_max, latency)
+        if not 200 <= status < 300:
+            self.http_errors += 1
+            print(f"HA request {path.decode()} returned {status}: {reply[:80]}")
+            return False
+        if self.verbose:
+            print(f"HA request {path.decode()} done in {latency} ms")
+        return True
+
+    async def _exchange(self, request):
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+            self.connects += 1
+        self._writer.write(request)
+        await self._writer.drain()
+
+        reader = self._reader
+        line = await reader.readline()
+        if not line:
+            raise EOFError("connection closed")
+        status = int(line.split(None, 2)[1])
+        length = 0
+        chunked = False
+        close = line.startswith(b"HTTP/1.0")
+        while True:
+            line = await reader.readline()
+            if not line:
+                raise EOFError("connection closed in headers")
+            if line == b"\r\n":
+                break
+            name, _, value = line.partition(b":")
+            name = name.strip().lower()
+            value = value.strip().lower()
+            if name == b"content-length":
+                length = int(value)
+            elif name == b"transfer-encoding":
+                chunked = value == b"chunked"
+            elif name == b"connection":
+                close = value == b"close"
+
+        if chunked:
+            reply = b""
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size:
+                    reply += await reader.readexactly(size)
+                await reader.readexactly(2)
+                if not size:
+                    break
+        else:
+            reply = await reader.readexactly(length) if length else b""
+        if close:
+            self._close()
+        return status, reply
+
+    def _close(self):
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            except Exception:
+                pass
+        self._reader = None
+        self._writer = None
+
+    def get_stats(self):
+        return {
+            "queue_depth": len(self._queue),
+            "queued": self.queued,
+            "dropped": self.dropped,
+            "sent": self.sent,
+            "failed": self.failed,
+            "http_errors": self.http_errors,
+            "connects": self.connects,
+            "retries": self.retries,
+            "latency_ms_avg": self._latency_ms_total // self.sent if self.sent else 0,
+            "latency_ms_max": self.latency_ms_max,
+        }
@@ -0,0 +1,104 @@
+import asyncio
+import hashlib
+import json
+import ubinascii
+
+DISCOVERY_PREFIX = "homeassistant"
+
+
+class HADiscovery:
+    """Home Assistant MQTT discovery for this device.
+
+    Every entity gets a retained config message under
+    <prefix>/<component>/<node_id>/<object_id>/config that points at the
+    device's availability topic. A hash of each config is kept in `hash_file`,
+    so a config is only published again when it changes (or after
+    forget()); Home Assistant gets the retained copies from the broker.
+    Entities that are no longer announced are passed to remove(), which
+    clears their retained config so Home Assistant deletes them.
+    """
+    def __init__(self, mqtt, node_id, device, hash_file="ha_discovery.json", prefix=DISCOVERY_PREFIX):
+        self.mqtt = mqtt
+        self.node_id = node_id
+        self.device = device
+        self.hash_file = hash_file
+        self.prefix = prefix
+        self.entities = []
+        self.removed = []
+        self.published = 0
+        self.unchanged = 0
+
+    def add(self, component, object_id, config):
+        """Register an entity; `config` holds its component-specific keys (state_topic, ...)."""
+        config = dict(config)
+        config["unique_id"] = f"{self.node_id}_{object_id}"
+        config["object_id"] = f"{self.node_id}_{object_id}"
+        config["device"] = self.device
+        if self.mqtt.availability_topic is not None:
+            config["availability_topic"] = self.mqtt.availability_topic.decode()
+        self.entities.append((self._topic(component, object_id), json.dumps(config)))
+
+    def remove(self, component, object_id):
+        """Withdraw an entity announced earlier: its retained config is replaced by an empty one."""
+        self.removed.append(self._topic(component, object_id))
+
+    def _topic(self, component, object_id):
+        return f"{self.prefix}/{component}/{self.node_id}/{object_id}/config"
+
+    def _load_hashes(self):
+        try:
+            with open(self.hash_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_hashes(self, hashes):
+        try:
+            with open(self.hash_file, 'w') as f:
+                json.dump(hashes, f)
+        except OSError as e:
+            print(f"Failed to save discovery hashes: {e}")
+
+    def forget(self):
+        """Drop the hash cache so every config is published again (e.g. after a broker reset)."""
+        self._save_hashes({})
+
+    async def publish_changed(self):
+        """Clear removed entities and publish the configs whose hash differs from the cached one.
+
+        Returns how many configs were published.
+        """
+        hashes = self._load_hashes()
+        changed = 0
+        dirty = False
+        try:
+            for topic in self.removed:
+                # An empty retained config makes Home Assistant delete the entity
+                await self.mqtt.client.publish(topic.encode(), b"", True, 1)
+                dirty = hashes.pop(topic, None) is not None or dirty
+            for topic, payload in self.entities:
+                digest = ubinascii.hexlify(hashlib.sha256(payload.encode()).digest()[:8]).decode()
+                if hashes.get(topic) == digest:
+                    self.unchanged += 1
+                    continue
+                await self.mqtt.client.publish(topic.encode(), payload.encode(), True, 1)
+                hashes[topic] = digest
+                changed += 1
+                dirty = True
+                self.published += 1
+        finally:
+            if dirty:
+                self._save_hashes(hashes)
+        return changed
+
+    async def run(self, retry_delay=30):
+        """Publish changed configs once the broker is reachable, retrying on failure."""
+        while True:
+            await self.mqtt.connection.wait_connected()
+            try:
+                changed = await self.publish_changed()
+                print(f"HA discovery: {changed} config(s) published, {len(self.entities) - changed} unchanged")
+                return
+            except Exception as e:
+                print(f"HA discovery failed: {e!r}")
+            await asyncio.sleep(retry_delay)
@@ -0,0 +1,137 @@
+import asyncio
+from ticks import ticks_ms, ticks_diff, ticks_add
+
+# Entity record fields
+_DESIRED = 0
+_ACKED = 1
+_SENDING = 2     # value of the request in flight, or None
+_NEXT_AT = 3     # ticks_ms before which nothing is sent (spacing / retry delay)
+_SEND = 4        # function(entity_id, value, done) queuing the request
+_FRESH = 5       # an update arrived since the last request was queued
+
+
+class EntityStateSync:
+    """Keeps Home Assistant entities at the latest state the device wants.
+
+    set_switch()/set_state() only record the desired state of an entity. A
+    background task (start()) sends it through an HAClient when it differs
+    from the last state Home Assistant acknowledged, with at most one
+    request in flight and `min_interval` seconds between requests per
+    entity. Updates arriving in between overwrite each other, so a
+    flickering sensor costs one request per interval at most; a failed
+    request is retried with the then-desired state after `retry_delay`.
+    """
+    def __init__(self, ha, min_interval=2, retry_delay=10):
+        self.ha = ha
+        self.min_interval_ms = int(min_interval * 1000)
+        self.retry_delay_ms = int(retry_delay * 1000)
+        self.entities = {}
+        self._wake = asyncio.Event()
+        self._task = None
+
+        self.updates = 0
+        self.coalesced = 0
+        self.requests = 0
+        self.retries = 0
+        self.acked = 0
+        self.failed = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def set_switch(self, entity_id, on):
+        """Want `entity_id` (input_boolean.x, switch.x, light.x, ...) on or off."""
+        self._set(entity_id, "on" if on else "off", self._call_service)
+
+    def set_state(self, entity_id, state, attributes=None):
+        """Want the state object of `entity_id` to be `state` (with `attributes`)."""
+        data = {"state": state}
+        if attributes:
+            data["attributes"] = attributes
+        self._set(entity_id, data, self._post_state)
+
+    def _set(self, entity_id, value, send):
+        self.updates += 1
+        entity = self.entities.get(entity_id)
+        if entity is None:
+            entity = self.entities[entity_id] = [value, None, None, ticks_ms(), send, True]
+        else:
+            if entity[_FRESH]:
+                # Overwrites an update that never got its own request
+                self.coalesced += 1
+            entity[_DESIRED] = value
+            entity[_FRESH] = True
+        self._wake.set()
+
+    def _call_service(self, entity_id, value, done):
+        service = "turn_on" if value == "on" else "turn_off"
+        self.ha.call_service(entity_id.split(".", 1)[0], service, entity_id, done)
+
+    def _post_state(self, entity_id, value, done):
+        self.ha.set_state(entity_id, value, done)
+
+    def _done(self, entity_id, ok):
+        entity = self.entities[entity_id]
+        if ok:
+            entity[_ACKED] = entity[_SENDING]
+            self.acked += 1
+        else:
+            self.failed += 1
+            entity[_NEXT_AT] = ticks_add(ticks_ms(), self.retry_delay_ms)
+        entity[_SENDING] = None
+        self._wake.set()
+
+    def _due(self):
+        # Send what is due; return ms until the next entity becomes due (None: nothing waiting)
+        now = ticks_ms()
+        wait = None
+        for entity_id, entity in self.entities.items():
+            if entity[_SENDING] is not None:
+                continue
+            if entity[_DESIRED] == entity[_ACKED]:
+                if entity[_FRESH]:
+                    # Home Assistant already has it
+                    self.coalesced += 1
+                    entity[_FRESH] = False
+                continue
+            left = ticks_diff(entity[_NEXT_AT], now)
+            if left > 0:
+                wait = left if wait is None else min(wait, left)
+                continue
+            value = entity[_DESIRED]
+            entity[_SENDING] = value
+            entity[_NEXT_AT] = ticks_add(now, self.min_interval_ms)
+            self.requests += 1
+            if not entity[_FRESH]:
+                self.retries += 1
+            entity[_FRESH] = False
+            entity[_SEND](entity_id, value, lambda ok, entity_id=entity_id: self._done(entity_id, ok))
+        return wait
+
+    async def run(self):
+        while True:
+            self._wake.clear()
+            wait = self._due()
+            try:
+                await asyncio.wait_for(self._wake.wait(), None if wait is None else wait / 1000)
+            except asyncio.TimeoutError:
+                pass
+
+    def get_stats(self):
+        return {
+            "entities": len(self.entities),
+            "updates": self.updates,
+            "requests": self.requests,
+            "retries": self.retries,
+            "coalesced": self.coalesced,
+            "acked": self.acked,
+            "failed": self.failed,
+            "out_of_sync": sum(1 for e in self.entities.values() if e[_DESIRED] != e[_ACKED]),
+        }
@@ -0,0 +1,177 @@
+import asyncio
+from ticks import ticks_ms, ticks_diff, ticks_add
+
+# LD2410 presence state bits (see ld2410.manager)
+_STATIONARY = 1
+_MOVING = 2
+
+SOURCES = ("pir", "radar", "lux")
+
+
+class OccupancyEngine:
+    """Fuses PIR, LD2410 and lux readings into one room state.
+
+    The drivers push into pir(), radar() and lux(); run() keeps the fused
+    state and calls on_change(occupied, confidence, source) only when it
+    flips between occupied and clear:
+
+    - a PIR edge, a moving radar target or a jump in light level (someone
+      switched the lights on) make the room occupied at once;
+    - while occupied, each of those plus a stationary radar target with at
+      least `stationary_energy` keep extending a hold timer (`pir_hold`,
+      `radar_hold`, `lux_hold` seconds), and the room turns clear once it
+      runs out. A stationary target alone never makes the room occupied,
+      since that is where the LD2410 gives false positives.
+
+    Confidence (0-100) is that of the strongest current evidence and fades
+    out over the hold time once the evidence is gone.
+    `radar_energy()`, if given, returns the current stationary energy.
+    """
+    def __init__(self, on_change=None, radar_energy=None, pir_hold=60, radar_hold=30, lux_hold=30,
+                 stationary_energy=20, lux_jump=30):
+        self.on_change = on_change
+        self.radar_energy = radar_energy
+        self.pir_hold_ms = int(pir_hold * 1000)
+        self.radar_hold_ms = int(radar_hold * 1000)
+        self.lux_hold_ms = int(lux_hold * 1000)
+        self.stationary_energy = stationary_energy
+        self.lux_jump = lux_jump
+
+        self.occupied = False
+        self.source = None
+        self._motion = False
+        self._radar_state = 0
+        self._lux = None
+        self._lux_jumped = False
+        self._hold_until = 0
+        self._confidence = 0
+        self._confidence_at = 0
+        self._wake = asyncio.Event()
+        self._task = None
+
+        self.changes = 0
+        self.triggers = dict.fromkeys(SOURCES, 0)
+        self.extensions = 0
+        self._occupied_at = None
+        self._occupied_ms_total = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def pir(self, motion):
+        """PIR output changed (PIRSensor.on_change)."""
+        self._motion = motion
+        self._wake.set()
+
+    def radar(self, state, previous=None):
+        """LD2410 zone state changed (RadarManager.on_zone_change)."""
+        self._radar_state = state
+        self._wake.set()
+
+    def lux(self, value):
+        """New light level reading; a jump by `lux_jump` to at least twice the last one counts as a trigger."""
+        last = self._lux
+        self._lux = value
+        if last is not None and value - last >= self.lux_jump and value >= 2 * last:
+            self._lux_jumped = True
+            self._wake.set()
+
+    def _current(self):
+        # (source, confidence, hold ms) of the strongest evidence present right now, or None
+        if self._motion:
+            return "pir", 90, self.pir_hold_ms
+        state = self._radar_state
+        if state & _MOVING:
+            return "radar", 80, self.radar_hold_ms
+        if state & _STATIONARY and self.occupied:
+            energy = self.radar_energy() if self.radar_energy is not None else self.stationary_energy
+            if energy >= self.stationary_energy:
+                return "radar", 40 + min(energy, 100) * 2 // 5, self.radar_hold_ms
+        return None
+
+    def _evaluate(self):
+        # Update the state; return ms until the hold runs out (None while clear)
+        now = ticks_ms()
+        best = self._current()
+        trigger = best is not None  # stationary targets only count once occupied
+        if self._lux_jumped:
+            self._lux_jumped = False
+            trigger = True
+            if best is None:
+                best = ("lux", 50, self.lux_hold_ms)
+        if best is not None:
+            until = ticks_add(now, best[2])
+            # A hold left over from the last occupied period may have wrapped around
+            if not self.occupied or ticks_diff(until, self._hold_until) > 0:
+                self._hold_until = until
+            self._confidence = best[1]
+            self._confidence_at = now
+        if not self.occupied:
+            if not trigger:
+                return None
+            self.triggers[best[0]] += 1
+            self._set(True, best[0], now)
+        elif best is not None:
+            self.extensions += 1
+        left = ticks_diff(self._hold_until, now)
+        if left > 0:
+            return left
+        self._set(False, self.source, now)
+        return None
+
+    def _set(self, occupied, source, now):
+        self.occupied = occupied
+        self.source = source
+        self.changes += 1
+        if occupied:
+            self._occupied_at = now
+        else:
+            self._occupied_ms_total += ticks_diff(now, self._occupied_at)
+            self._occupied_at = None
+            self._confidence = 0
+        if self.on_change is not None:
+            self.on_change(occupied, self.confidence(), source)
+
+    def confidence(self):
+        """Current confidence that the room is occupied (0-100)."""
+        if not self.occupied:
+            return 0
+        best = self._current()
+        if best is not None:
+            return best[1]
+        now = ticks_ms()
+        span = ticks_diff(self._hold_until, self._confidence_at)
+        left = ticks_diff(self._hold_until, now)
+        if span <= 0 or left >= span:
+            return self._confidence
+        return max(0, self._confidence * left // span)
+
+    async def run(self):
+        while True:
+            self._wake.clear()
+            wait = self._evaluate()
+            try:
+                await asyncio.wait_for(self._wake.wait(), None if wait is None else wait / 1000)
+            except asyncio.TimeoutError:
+                pass
+
+    def get_stats(self):
+        total = self._occupied_ms_total
+        if self._occupied_at is not None:
+            total += ticks_diff(ticks_ms(), self._occupied_at)
+        return {
+            "occupied": self.occupied,
+            "confidence": self.confidence(),
+            "source": self.source,
+            "changes": self.changes,
+            "triggers": self.triggers,
+            "extensions": self.extensions,
+            "occupied_s_total": total // 1000,
+        }
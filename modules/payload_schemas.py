@@ -0,0 +1,21 @@
+from umqtt.codec import StructCodec
+
+# Schema ids are the first byte of every StructCodec payload
+CLIMATE_SCHEMA = 1
+MMWAVE_STATE_SCHEMA = 2
+
+
+def climate_codec():
+    """DHT11 reading: temperature (signed °C), humidity (%)."""
+    return StructCodec(CLIMATE_SCHEMA, ("temperature", "humidity"), "bB")
+
+
+def mmwave_state_codec(radar_names):
+    """LD2410 zone state: presence flag and zone state, then per radar its state and target data."""
+    names = ["is_presence", "state"]
+    fmt = "BB"
+    for name in radar_names:
+        names += [name + ".state", name + ".moving_dist", name + ".moving_energy",
+                  name + ".stat_dist", name + ".detect_dist"]
+        fmt += "BHBHH"
+    return StructCodec(MMWAVE_STATE_SCHEMA, names, fmt)
@@ -1,52 +1,152 @@
-import uasyncio as asyncio
-from machine import Pin
+import asyncio
+from ticks import ticks_ms, ticks_diff
+try:
+    from machine import Pin
+except ImportError:
+    # Host-side (CPython) tests with tools/fake_pin.FakePin
+    Pin = None
+
+try:
+    ThreadSafeFlag = asyncio.ThreadSafeFlag
+except AttributeError:
+    class ThreadSafeFlag:
+        """Host-side stand-in for asyncio.ThreadSafeFlag (set from the fake pin's IRQ)."""
+        def __init__(self):
+            self._event = asyncio.Event()
+
+        def set(self):
+            self._event.set()
+
+        async def wait(self):
+            await self._event.wait()
+            self._event.clear()
 
-from modules.ha_connection import toggle_entity
-from modules.rgb_led_module import RGBLEDController
-rgb_controller=RGBLEDController()
 
 class PIRSensor:
-    def __init__(self, pir_pin=16):
-        """Initialize PIR sensor with the specified pin."""
-        self.pir = Pin(pir_pin, Pin.IN)
+    def __init__(self, pir_pin=16, on_change=None, ha=None, rgb=None, debounce_ms=50, hold_s=0, pin=None):
+        """Initialize PIR sensor with the specified pin.
+
+        on_change(motion) is called with True/False whenever motion starts or stops.
+        With an EntityStateSync as `ha`, every edge sets the desired state of
+        input_boolean.mobile_motion_sensor; the sync task sends only the latest
+        one, so neither motion edges nor flapping wait on Home Assistant.
+        With an RGBLEDController as `rgb`, the LED show runs while there is motion.
+
+        Edges raise a pin interrupt that wakes the detection loop, so nothing
+        runs while the output is steady. The level is read `debounce_ms` after
+        an edge, and motion only ends once the output stayed low for `hold_s`
+        seconds. `pin` replaces the machine.Pin (e.g. a FakePin on Linux).
+        """
+        self.pir = pin if pin is not None else Pin(pir_pin, Pin.IN)
+        self.on_change = on_change
+        self.ha = ha
+        self.rgb = rgb
+        self.debounce_ms = debounce_ms
+        self.hold_ms = int(hold_s * 1000)
+        self.motion = False
+        self.changed_at = None      # ticks_ms of the edge behind the last motion change
         self._is_active = False
-        self._is_running=False
         self._running = asyncio.Event()
-        
+        self._flag = ThreadSafeFlag()
+        self._irq_handler = self._irq  # bound once, so the ISR does not allocate
+        self._edge_at = 0
+
+        self.edges = 0
+        self.bounces = 0
+        self.motion_events = 0
+        self._latency_ms_total = 0
+        self.latency_ms_max = 0
+
+    def _irq(self, pin):
+        # Interrupt context: no allocation, just note the time and wake the loop
+        self._edge_at = ticks_ms()
+        self.edges += 1
+        self._flag.set()
+
     async def activate_pir(self):
         """Start the PIR sensor detection loop."""
         if self._is_active:
             print("PIR sensor is already active")
             return
-        
+
         self._is_active = True
         self._running.set()
+        self._edge_at = ticks_ms()
+        self.pir.irq(handler=self._irq_handler, trigger=self.pir.IRQ_RISING | self.pir.IRQ_FALLING)
         print("PIR sensor activated")
-        
+        if self.pir.value():
+            self._set_motion(True, self._edge_at)
+
+        try:
+            while await self._wait_edge():
+                edge_at = self._edge_at  # first edge of a bouncing burst
+                if self.debounce_ms:
+                    await asyncio.sleep(self.debounce_ms / 1000)
+                level = self.pir.value() == 1
+                if level == self.motion:
+                    self.bounces += 1
+                elif level or not self.hold_ms:
+                    self._set_motion(level, edge_at)
+                # Low with a hold time: _wait_edge() ends the motion once it runs out
+        finally:
+            self.pir.irq(handler=None)
+            self._is_active = False
+        print("PIR sensor deactivated")
+
+    async def _wait_edge(self):
+        # Wait for the next edge, ending motion if the hold time runs out first; False to stop
         while self._running.is_set():
-            if self.pir.value() == 1:
-                if self._is_running is not True:
-                    if rgb_controller.is_running is False:
-                        toggle_entity(domain='input_boolean',entity='input_boolean.mobile_motion_sensor',action='turn_on')
-                        rgb_controller.rgb_task = asyncio.create_task(rgb_controller.run_rgb_led(sleep_time=2))
-                    print("Motion detected!")
-                    self._is_running=True
+            if self.motion and self.hold_ms and not self.pir.value():
+                left = self.hold_ms - ticks_diff(ticks_ms(), self._edge_at)
+                if left <= 0:
+                    self._set_motion(False, self._edge_at)
+                    continue
+                try:
+                    await asyncio.wait_for(self._flag.wait(), left / 1000)
+                except asyncio.TimeoutError:
+                    continue
             else:
-                if self._is_running:
-                    if rgb_controller.rgb_task is not None:
-                        rgb_controller.rgb_task.cancel()
-                        rgb_controller.rgb_task = None
-                        toggle_entity(domain='input_boolean',entity='input_boolean.mobile_motion_sensor',action='turn_off')
-                        print("No motion")
-                    self._is_running=False
-            await asyncio.sleep(0.5)  # Check every 500ms
-        
-        self._is_active = False
-        print("PIR sensor deactivated")
-    
+                await self._flag.wait()
+            return self._running.is_set()
+        return False
+
+    def _set_motion(self, motion, edge_at):
+        self.motion = motion
+        self.changed_at = edge_at
+        if motion:
+            # Edge to report; the hold time on the way out is deliberate, so not counted
+            self.motion_events += 1
+            latency = ticks_diff(ticks_ms(), self.changed_at)
+            self._latency_ms_total += latency
+            self.latency_ms_max = max(self.latency_ms_max, latency)
+        print("Motion detected!" if motion else "No motion")
+
+        if self.ha is not None:
+            self.ha.set_switch('input_boolean.mobile_motion_sensor', motion)
+        rgb = self.rgb
+        if rgb is not None:
+            if motion and rgb.is_running is False:
+                rgb.rgb_task = asyncio.create_task(rgb.run_rgb_led(sleep_time=2))
+            elif not motion and rgb.rgb_task is not None:
+                rgb.rgb_task.cancel()
+                rgb.rgb_task = None
+        if self.on_change:
+            self.on_change(motion)
+
     def deactivate_pir(self):
         """Stop the PIR sensor detection loop."""
         if not self._is_active:
             print("PIR sensor is already deactivated")
             return
-        self._running.clear()
\ No newline at end of file
+        self._running.clear()
+        self._flag.set()
+
+    def get_stats(self):
+        return {
+            "motion": self.motion,
+            "edges": self.edges,
+            "bounces": self.bounces,
+            "motion_events": self.motion_events,
+            "latency_ms_avg": self._latency_ms_total // self.motion_events if self.motion_events else 0,
+            "latency_ms_max": self.latency_ms_max,
+        }
@@ -0,0 +1,143 @@
+import json
+from ticks import ticks_us, ticks_diff
+
+_OPS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a is not None and a < b,
+    "<=": lambda a, b: a is not None and a <= b,
+    ">": lambda a, b: a is not None and a > b,
+    ">=": lambda a, b: a is not None and a >= b,
+}
+
+# Compiled rule fields
+_NAME = 0
+_WHEN = 1       # ((fact, op function, value), ...), all must hold
+_THEN = 2       # ((action function, args), ...) run when the conditions become true
+_ELSE = 3       # ... and when they become false again
+_STATE = 4      # last result (None before the first evaluation)
+_HITS = 5
+_ELSE_HITS = 6
+
+
+class RulesEngine:
+    """Local automations: sensor facts in, actions out, no Home Assistant round trip.
+
+    Rules are JSON, e.g.
+
+        [{"name": "night_light",
+          "when": [["occupied", "==", true], ["lux", "<", 20]],
+          "then": [["rgb_show", 2]],
+          "else": [["rgb_stop"]]}]
+
+    and are compiled once by load() into predicate/action tables, with each
+    fact mapped to the rules that read it. update(fact, value) re-evaluates
+    only those rules; a rule runs its "then" actions when its conditions
+    become true and its "else" actions when they become false, so a rule
+    fires on edges, not on every reading. A rule that starts out false stays
+    silent until it first becomes true. `actions` maps action names to
+    functions taking the rule's arguments.
+    """
+    def __init__(self, actions):
+        self.actions = actions
+        self.facts = {}
+        self.rules = []
+        self._by_fact = {}
+
+        self.evaluations = 0
+        self.action_errors = 0
+        self._eval_us_total = 0
+        self.eval_us_max = 0
+
+    def load(self, path, default=None):
+        """Compile the rules in `path`, or `default` (a list) if the file is missing or invalid."""
+        try:
+            with open(path) as f:
+                rules = json.load(f)
+        except (OSError, ValueError) as e:
+            if default is None:
+                print(f"No rules loaded from {path}: {e}")
+                return 0
+            rules = default
+        return self.compile(rules)
+
+    def compile(self, rules):
+        """Replace the rule tables with `rules`; returns how many compiled."""
+        self.rules = []
+        self._by_fact = {}
+        for rule in rules:
+            try:
+                compiled = [
+                    rule["name"],
+                    tuple((fact, _OPS[op], value) for fact, op, value in rule.get("when", ())),
+                    self._compile_actions(rule.get("then", ())),
+                    self._compile_actions(rule.get("else", ())),
+                    None, 0, 0,
+                ]
+            except (AttributeError, KeyError, TypeError, ValueError) as e:
+                print(f"Skipping rule {rule!r}: {e!r}")
+                continue
+            self.rules.append(compiled)
+            for fact in set(condition[0] for condition in compiled[_WHEN]):
+                self._by_fact.setdefault(fact, []).append(compiled)
+        return len(self.rules)
+
+    def _compile_actions(self, actions):
+        compiled = []
+        for action in actions:
+            if isinstance(action, str):
+                action = [action]
+            compiled.append((self.actions[action[0]], tuple(action[1:])))
+        return tuple(compiled)
+
+    def update(self, fact, value):
+        """Record a sensor fact and evaluate the rules that read it."""
+        if fact in self.facts and self.facts[fact] == value:
+            return
+        self.facts[fact] = value
+        rules = self._by_fact.get(fact)
+        if not rules:
+            return
+        started = ticks_us()
+        facts = self.facts
+        for rule in rules:
+            result = True
+            for name, op, expected in rule[_WHEN]:
+                if not op(facts.get(name), expected):
+                    result = False
+                    break
+            previous = rule[_STATE]
+            if result == previous:
+                continue
+            rule[_STATE] = result
+            if previous is None and not result:
+                # Nothing ran yet, so there is nothing to undo
+                continue
+            if result:
+                rule[_HITS] += 1
+                self._run(rule[_THEN])
+            else:
+                rule[_ELSE_HITS] += 1
+                self._run(rule[_ELSE])
+        elapsed = ticks_diff(ticks_us(), started)
+        self.evaluations += 1
+        self._eval_us_total += elapsed
+        self.eval_us_max = max(self.eval_us_max, elapsed)
+
+    def _run(self, actions):
+        for action, args in actions:
+            try:
+                action(*args)
+            except Exception as e:
+                self.action_errors += 1
+                print(f"Rule action failed: {e!r}")
+
+    def get_stats(self):
+        return {
+            "rules": {rule[_NAME]: {"hits": rule[_HITS], "else_hits": rule[_ELSE_HITS], "active": rule[_STATE]}
+                      for rule in self.rules},
+            "evaluations": self.evaluations,
+            "action_errors": self.action_errors,
+            "eval_us_avg": self._eval_us_total // self.evaluations if self.evaluations else 0,
+            "eval_us_max": self.eval_us_max,
+        }
@@ -0,0 +1,33 @@
+"""Host-side stand-in for machine.Pin, used to drive the PIR driver on Linux."""
+
+
+class FakePin:
+    IN = 0
+    OUT = 1
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    def __init__(self, level=0):
+        self.level = level
+        self.handler = None
+        self.trigger = 0
+        self.irqs = 0
+
+    def value(self, level=None):
+        if level is None:
+            return self.level
+        self.set(level)
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING):
+        self.handler = handler
+        self.trigger = trigger
+
+    def set(self, level):
+        """Drive the pin as the sensor would, firing the IRQ handler on a matching edge."""
+        level = 1 if level else 0
+        if level == self.level:
+            return
+        self.level = level
+        if self.handler is not None and self.trigger & (self.IRQ_RISING if level else self.IRQ_FALLING):
+            self.irqs += 1
+            self.handler(self)
@@ -0,0 +1,79 @@
+"""Host-side stand-in for machine.UART, used to replay LD2410 traffic on Linux."""
+import struct
+
+REPORT_HEAD = b'\xf4\xf3\xf2\xf1'
+REPORT_TAIL = b'\xf8\xf7\xf6\xf5'
+CMD_HEAD = b'\xfd\xfc\xfb\xfa'
+CMD_TAIL = b'\x04\x03\x02\x01'
+
+
+class FakeUART:
+    def __init__(self, data=b'', max_read=None):
+        """Replay `data`; max_read caps the bytes handed out per readinto() call."""
+        self.rx = bytearray(data)
+        self.max_read = max_read
+        self.written = bytearray()
+
+    @classmethod
+    def from_file(cls, path, max_read=None):
+        """Replay a raw dump of UART bytes."""
+        with open(path, 'rb') as f:
+            return cls(f.read(), max_read)
+
+    def feed(self, data):
+        """Append bytes as if they had just arrived on the wire."""
+        self.rx += data
+
+    def any(self):
+        return len(self.rx)
+
+    def read(self, nbytes=None):
+        if not self.rx:
+            return None
+        n = len(self.rx) if nbytes is None else min(nbytes, len(self.rx))
+        data = bytes(self.rx[:n])
+        del self.rx[:n]
+        return data
+
+    def readinto(self, buf, nbytes=None):
+        n = min(len(buf) if nbytes is None else nbytes, len(self.rx))
+        if self.max_read is not None:
+            n = min(n, self.max_read)
+        if n == 0:
+            return None
+        buf[:n] = self.rx[:n]
+        del self.rx[:n]
+        return n
+
+    def write(self, buf):
+        self.written += buf
+        return len(buf)
+
+
+def report_frame(payload):
+    return REPORT_HEAD + struct.pack('<H', len(payload)) + payload + REPORT_TAIL
+
+
+def target_frame(state=2, moving_distance=120, moving_energy=60,
+                 stationary_distance=150, stationary_energy=40, detection_distance=160):
+    """Basic (type 0x02) target report."""
+    data = struct.pack('<BHBHBH', state, moving_distance, moving_energy,
+                       stationary_distance, stationary_energy, detection_distance)
+    return report_frame(b'\x02\xaa' + data + b'\x55\x00')
+
+
+def engineering_frame(state=3, moving_gates=None, stationary_gates=None,
+                      max_moving_gate=8, max_stationary_gate=8):
+    """Engineering-mode (type 0x01) report with per-gate energies."""
+    moving_gates = moving_gates or [10 * i for i in range(9)]
+    stationary_gates = stationary_gates or [90 - 10 * i for i in range(9)]
+    data = struct.pack('<BHBHBH', state, 120, 60, 150, 40, 160)
+    data += bytes([max_moving_gate, max_stationary_gate])
+    data += bytes(moving_gates) + bytes(stationary_gates) + b'\x00\x00'
+    return report_frame(b'\x01\xaa' + data + b'\x55\x00')
+
+
+def ack_frame(cmd, status=0, data=b''):
+    """ACK for command `cmd` as sent by the radar."""
+    payload = struct.pack('<HH', cmd | 0x0100, status) + data
+    return CMD_HEAD + struct.pack('<H', len(payload)) + payload + CMD_TAIL
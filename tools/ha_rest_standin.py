@@ -0,0 +1,234 @@
+"""In-process Home Assistant REST API stand-in for exercising modules/ha_client.py on Linux.
+
+    python3 tools/ha_rest_standin.py
+
+Runs a smoke check of HAClient against the stand-in: requests return to the
+caller at once, are sent in order over one keep-alive connection, survive
+the server closing an idle connection, and failures (HTTP errors, a server
+that stops answering) are counted without stalling the event loop. It then
+checks that EntityStateSync collapses a flapping switch into a few
+requests and retries a failed update.
+StandInHA can also be imported by other host-side scripts.
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'lib'))
+sys.path.insert(0, ROOT)
+
+
+class StandInHA:
+    """Minimal HTTP/1.1 server answering POST /api/services/... and /api/states/... like Home Assistant."""
+    def __init__(self, host='127.0.0.1', port=0):
+        self.host = host
+        self.port = port
+        self.server = None
+        self.delay = 0            # seconds before each response
+        self.status = 200         # status code returned for every request
+        self.stalled = False      # read requests but never answer
+        self.close_after = 0      # close the connection after this many responses (0 = keep alive)
+        self.chunked = False      # send bodies with Transfer-Encoding: chunked
+        self.requests = []        # (path, payload, authorization)
+        self.states = {}
+        self.connections = 0
+        self._writers = set()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._session, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self.drop_connections()
+        self.server.close()
+        await self.server.wait_closed()
+
+    def drop_connections(self):
+        for writer in list(self._writers):
+            writer.transport.abort()
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/api"
+
+    async def _session(self, reader, writer):
+        self.connections += 1
+        self._writers.add(writer)
+        served = 0
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                method, path, _ = line.decode().split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b''):
+                        break
+                    name, _, value = line.decode().partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                payload = json.loads(body) if body else None
+                self.requests.append((path, payload, headers.get('authorization')))
+                if self.stalled:
+                    continue
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                if path.startswith('/api/states/') and self.status < 300:
+                    self.states[path[12:]] = payload
+                reply = json.dumps(payload if path.startswith('/api/states/') else []).encode()
+                served += 1
+                close = self.close_after and served >= self.close_after
+                head = f"HTTP/1.1 {self.status} OK\r\nContent-Type: application/json\r\n"
+                if close:
+                    head += "Connection: close\r\n"
+                if self.chunked:
+                    half = len(reply) // 2
+                    writer.write((head + "Transfer-Encoding: chunked\r\n\r\n").encode())
+                    for part in (reply[:half], reply[half:], b''):
+                        writer.write(b'%x\r\n%s\r\n' % (len(part), part))
+                else:
+                    writer.write((head + f"Content-Length: {len(reply)}\r\n\r\n").encode() + reply)
+                await writer.drain()
+                if close:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+
+async def _settle(ha, timeout=2.0):
+    """Wait until the client's queue is empty and the last request finished."""
+    deadline = time.monotonic() + timeout
+    total = ha.queued - ha.dropped
+    while ha.sent + ha.failed < total and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+
+
+async def smoke():
+    from modules.ha_client import HAClient
+    from modules.ha_state_sync import EntityStateSync
+
+    failures = 0
+
+    def check(name, ok):
+        nonlocal failures
+        print(("PASS " if ok else "FAIL ") + name)
+        failures += not ok
+
+    server = await StandInHA().start()
+    server.delay = 0.02
+    ha = HAClient(server.url, "Bearer test-token", timeout=0.5)
+    ha.start()
+
+    started = time.monotonic()
+    for i in range(10):
+        ha.call_service("input_boolean", "turn_on" if i % 2 else "turn_off", "input_boolean.mobile_motion_sensor")
+    queued_in = time.monotonic() - started
+    ha.set_state("sensor.pico_lux", {"state": "42", "attributes": {"unit_of_measurement": "lx"}})
+    await _settle(ha)
+    paths = [r[0] for r in server.requests]
+    check(f"11 requests queued in {queued_in * 1000:.2f} ms, delivered in order over "
+          f"{server.connections} connection(s)",
+          queued_in < 0.01 and len(paths) == 11 and server.connections == 1
+          and paths[0] == "/api/services/input_boolean/turn_off" and paths[-1] == "/api/states/sensor.pico_lux")
+    check("auth header and payloads passed through",
+          all(r[2] == "Bearer test-token" for r in server.requests)
+          and server.states.get("sensor.pico_lux", {}).get("state") == "42")
+
+    server.chunked = True
+    ha.call_service("light", "toggle", "light.tv_light")
+    await _settle(ha)
+    server.chunked = False
+    check("chunked response read without dropping the connection",
+          ha.sent == 12 and server.connections == 1)
+
+    server.drop_connections()
+    await asyncio.sleep(0.05)
+    ha.call_service("light", "turn_on", "light.tv_light")
+    await _settle(ha)
+    check(f"request after server closed the idle connection: {ha.retries} retry, {server.connections} connections",
+          ha.sent == 13 and ha.failed == 0 and ha.retries == 1 and server.connections == 2)
+
+    server.close_after = 1
+    for _ in range(3):
+        ha.call_service("light", "turn_off", "light.tv_light")
+    await _settle(ha)
+    server.close_after = 0
+    check(f"Connection: close honoured ({server.connections} connections)",
+          ha.sent == 16 and ha.failed == 0 and server.connections == 4)
+
+    server.status = 500
+    ha.call_service("light", "turn_on", "light.missing")
+    await _settle(ha)
+    server.status = 200
+    check("HTTP error counted", ha.http_errors == 1)
+
+    server.stalled = True
+    gaps = [0.0]
+
+    async def ticker():
+        last = time.monotonic()
+        while True:
+            await asyncio.sleep(0.01)
+            now = time.monotonic()
+            gaps[0] = max(gaps[0], now - last)
+            last = now
+
+    task = asyncio.create_task(ticker())
+    ha.call_service("light", "turn_on", "light.tv_light")
+    await _settle(ha)
+    task.cancel()
+    server.stalled = False
+    check(f"stalled server: request failed after timeout, loop stall {gaps[0] * 1000:.0f} ms",
+          ha.failed == 1 and ha.retries == 1 and gaps[0] < 0.1)
+
+    ha.call_service("light", "turn_on", "light.tv_light")
+    await _settle(ha)
+    check("recovers after a failed request", ha.sent == 18 and ha.failed == 1)
+
+    sync = EntityStateSync(ha, min_interval=0.1, retry_delay=0.2)
+    sync.start()
+    before = len(server.requests)
+    for i in range(21):
+        sync.set_switch("input_boolean.mobile_motion_sensor", i % 2 == 0)
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.3)
+    flaps = server.requests[before:]
+    check(f"21 flapping updates sent as {len(flaps)} requests, final state on",
+          len(flaps) <= 4 and flaps[-1][0] == "/api/services/input_boolean/turn_on"
+          and sync.get_stats()["out_of_sync"] == 0)
+
+    server.status = 500
+    sync.set_state("sensor.pico_lux", "17")
+    await asyncio.sleep(0.1)
+    server.status = 200
+    sync.set_state("sensor.pico_lux", "18")
+    await asyncio.sleep(0.4)
+    check("failed update retried with the latest desired state",
+          sync.failed == 1 and server.states["sensor.pico_lux"]["state"] == "18"
+          and sync.get_stats()["out_of_sync"] == 0)
+    print(json.dumps(sync.get_stats()))
+    sync.stop()
+
+    ha.stop()
+    small = HAClient(server.url, "Bearer test-token", max_queue=4)
+    for i in range(6):
+        small.set_state("sensor.count", {"state": str(i)})
+    check("full queue drops the oldest requests", small.dropped == 2 and small.pending() == 4)
+
+    print(json.dumps(ha.get_stats()))
+    await asyncio.sleep(0.05)
+    await server.stop()
+    return failures
+
+
+if __name__ == '__main__':
+    sys.exit(1 if asyncio.run(smoke()) else 0)
@@ -0,0 +1,63 @@
+"""Measure LD2410 parser throughput on the host.
+
+    python3 tools/ld2410_bench.py [--frames N] [--chunk BYTES] [--capture FILE]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+
+from ld2410.ld2410 import LD2410
+from fake_uart import FakeUART, target_frame, engineering_frame
+
+
+def synthetic_stream(frames):
+    out = bytearray()
+    for i in range(frames):
+        if i % 2:
+            out += engineering_frame(state=i & 3)
+        else:
+            out += target_frame(state=i & 3, moving_distance=i & 0x3ff)
+    return bytes(out)
+
+
+def run(stream, chunk):
+    """Feed `stream` in `chunk`-byte bursts, one update() per burst."""
+    uart = FakeUART()
+    radar = LD2410(uart)
+    calls = 0
+    frames = 0
+    elapsed = 0.0
+    for pos in range(0, len(stream), chunk):
+        uart.feed(stream[pos:pos + chunk])
+        start = time.perf_counter()
+        frames += radar.update()
+        elapsed += time.perf_counter() - start
+        calls += 1
+    return frames, calls, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, default=20000)
+    parser.add_argument('--chunk', type=int, default=64, help='bytes available per update() call')
+    parser.add_argument('--capture', help='raw UART dump to replay instead of synthetic frames')
+    args = parser.parse_args()
+
+    if args.capture:
+        with open(args.capture, 'rb') as f:
+            stream = f.read()
+    else:
+        stream = synthetic_stream(args.frames)
+
+    frames, calls, elapsed = run(stream, args.chunk)
+    print(f"bytes:          {len(stream)}")
+    print(f"update() calls: {calls} ({len(stream) / calls:.1f} bytes/call, {frames / calls:.2f} frames/call)")
+    print(f"frames decoded: {frames}")
+    print(f"throughput:     {frames / elapsed:.0f} frames/s, {len(stream) / elapsed / 1024:.0f} KiB/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""Drive RadarManager with two LD2410 radars on FakeUARTs through both merge modes.
+
+    python3 tools/ld2410_manager_check.py
+
+Feeds target reports to each radar, runs one manager update() and checks
+the merged zone state, and that the on_zone_change notifications form an
+unbroken chain ending at it (radars are drained one after the other, so
+one update() may pass through an intermediate zone state).
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+
+from ld2410.ld2410 import LD2410
+from ld2410.manager import RadarManager, MERGE_ANY, MERGE_ALL
+from fake_uart import FakeUART, target_frame
+
+# (radar1 state, radar2 state) -> expected zone state per merge mode
+CASES = (
+    ((0, 0), {MERGE_ANY: 0, MERGE_ALL: 0}),
+    ((2, 0), {MERGE_ANY: 2, MERGE_ALL: 0}),
+    ((1, 2), {MERGE_ANY: 3, MERGE_ALL: 3}),
+    ((1, 1), {MERGE_ANY: 1, MERGE_ALL: 1}),
+    ((3, 2), {MERGE_ANY: 3, MERGE_ALL: 3}),
+    ((0, 3), {MERGE_ANY: 3, MERGE_ALL: 0}),
+    ((0, 0), {MERGE_ANY: 0, MERGE_ALL: 0}),
+)
+
+
+def check_mode(merge):
+    manager = RadarManager(merge=merge)
+    uarts = (FakeUART(), FakeUART())
+    for i, uart in enumerate(uarts):
+        manager.add(f"radar{i + 1}", LD2410(uart))
+    changes = []
+    manager.on_zone_change = lambda zone, previous: changes.append((previous, zone))
+
+    failures = 0
+    for states, expected in CASES:
+        for uart, state in zip(uarts, states):
+            uart.feed(target_frame(state=state))
+        manager.update()
+        ok = manager.zone_state == expected[merge]
+        print(f"{'PASS' if ok else 'FAIL'} merge={merge} states={states} -> zone {manager.zone_state}"
+              f" (expected {expected[merge]})")
+        failures += not ok
+    ok = (changes[0][0] == 0 and changes[-1][1] == manager.zone_state
+          and all(a[1] == b[0] != b[1] for a, b in zip(changes, changes[1:])))
+    print(f"{'PASS' if ok else 'FAIL'} merge={merge}: {len(changes)} zone change notification(s), consistent")
+    return failures + (not ok)
+
+
+def main():
+    failures = check_mode(MERGE_ANY) + check_mode(MERGE_ALL)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""Replay LD2410 UART captures or synthetic streams through the parser.
+
+    python3 tools/ld2410_replay.py ld2410.cap [more.cap ...]
+    python3 tools/ld2410_replay.py --synthetic 5000 --garbage 0.05 --truncate 0.02 --split
+
+Capture files come from ld2410.capture.UARTCapture on the device; each
+recorded UART read is replayed as one update() call.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+
+from ld2410.ld2410 import LD2410
+from ld2410.capture import read_capture
+from fake_uart import FakeUART, target_frame, engineering_frame, ack_frame
+
+
+def synthetic_chunks(frames, garbage, truncate, split, rng):
+    """Build a stream with noise between frames and cut it into UART-sized reads.
+
+    Returns (chunks, number of intact frames in the stream).
+    """
+    stream = bytearray()
+    intact = 0
+    for i in range(frames):
+        kind = rng.random()
+        if kind < 0.45:
+            frame = target_frame(state=rng.randrange(4), moving_distance=rng.randrange(600))
+        elif kind < 0.95:
+            frame = engineering_frame(state=rng.randrange(4),
+                                      moving_gates=[rng.randrange(101) for _ in range(9)],
+                                      stationary_gates=[rng.randrange(101) for _ in range(9)])
+        else:
+            frame = ack_frame(0x61, data=bytes(24))
+        if rng.random() < garbage:
+            # Line noise, sometimes containing a stray header byte
+            stream += bytes(rng.choice((0x00, 0xf4, 0xfd, rng.randrange(256))) for _ in range(rng.randrange(1, 16)))
+        if rng.random() < truncate:
+            stream += frame[:rng.randrange(1, len(frame))]
+            continue
+        stream += frame
+        intact += 1
+
+    chunks = []
+    pos = 0
+    while pos < len(stream):
+        size = rng.randrange(1, 96) if split else 64
+        chunks.append(bytes(stream[pos:pos + size]))
+        pos += size
+    return chunks, intact
+
+
+def replay(chunks):
+    uart = FakeUART()
+    radar = LD2410(uart)
+    frames = 0
+    nbytes = 0
+    elapsed = 0.0
+    for chunk in chunks:
+        uart.feed(chunk)
+        nbytes += len(chunk)
+        start = time.perf_counter()
+        frames += radar.update()
+        elapsed += time.perf_counter() - start
+    return radar, frames, nbytes, elapsed
+
+
+def report(name, radar, frames, nbytes, elapsed, expected=None):
+    print(f"== {name}")
+    print(f"bytes fed:       {nbytes}")
+    if expected is None:
+        print(f"frames decoded:  {frames}")
+    else:
+        print(f"frames decoded:  {frames} of {expected} intact")
+    print(f"resync events:   {radar.resyncs}")
+    print(f"bytes discarded: {radar.bytes_skipped}")
+    print(f"bad header/tail: {radar.bad_header}/{radar.bad_tail}, truncated: {radar.truncated}")
+    if frames:
+        print(f"decode time:     {elapsed / frames * 1e6:.2f} us/frame")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('captures', nargs='*', help='capture files recorded on the device')
+    parser.add_argument('--synthetic', type=int, metavar='FRAMES', help='generate a synthetic stream')
+    parser.add_argument('--garbage', type=float, default=0.05, help='probability of noise before a frame')
+    parser.add_argument('--truncate', type=float, default=0.02, help='probability of a cut-off frame')
+    parser.add_argument('--split', action='store_true', help='random read sizes instead of 64-byte reads')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    if not args.captures and not args.synthetic:
+        parser.error('give capture files and/or --synthetic FRAMES')
+
+    for path in args.captures:
+        chunks = [data for _, data in read_capture(path)]
+        report(path, *replay(chunks))
+
+    if args.synthetic:
+        rng = random.Random(args.seed)
+        chunks, intact = synthetic_chunks(args.synthetic, args.garbage, args.truncate, args.split, rng)
+        report('synthetic', *replay(chunks), expected=intact)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,334 @@
+"""In-process MQTT broker stand-in for exercising the asyncio MQTT stack on Linux.
+
+    python3 tools/mqtt_broker_standin.py
+
+Runs a smoke check of AsyncMqttPublisher against the stand-in: normal
+publishing, a broker that stops answering, per-topic coalescing and
+priority, a dropped connection, template payloads, store-and-forward while the
+broker is down, the QoS 1 in-flight window and keepalive/reconnect handling.
+StandInBroker can also be imported by other host-side scripts.
+"""
+import asyncio
+import json
+import os
+import struct
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+
+
+def topic_matches(pattern, topic):
+    p = pattern.split('/')
+    t = topic.split('/')
+    for i, part in enumerate(p):
+        if part == '#':
+            return True
+        if i >= len(t) or (part != '+' and part != t[i]):
+            return False
+    return len(p) == len(t)
+
+
+class StandInBroker:
+    """Minimal MQTT 3.1.1 broker: QoS 0/1, retained messages, last will, ping."""
+    def __init__(self, host='127.0.0.1', port=0):
+        self.host = host
+        self.port = port
+        self.server = None
+        self.stalled = False      # swallow packets without answering (dead broker)
+        self.drop_pubacks = 0     # number of PUBACKs to withhold
+        self.puback_delay = 0     # seconds before each PUBACK is sent (network round trip)
+        self.published = []       # (topic, payload, qos, retain)
+        self.retained = {}
+        self.connects = 0
+        self.pings = 0
+        self._sessions = set()
+        self._subscribers = []    # (topic filter, writer)
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._session, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self.drop_connections()
+        self.server.close()
+        await self.server.wait_closed()
+
+    def _puback(self, writer, pid):
+        if not writer.is_closing():
+            writer.write(b'\x40\x02' + pid)
+
+    def drop_connections(self):
+        """Close every client socket without a DISCONNECT, like a broker restart."""
+        for writer in list(self._sessions):
+            writer.transport.abort()
+
+    def config(self, **extra):
+        """MqttPublisher config pointing at this broker."""
+        return dict({'broker': self.host, 'port': self.port, 'client_id': b'standin-test', 'timeout': 1,
+                     'backoff_base': 0.05, 'backoff_max': 0.2}, **extra)
+
+    async def _session(self, reader, writer):
+        self._sessions.add(writer)
+        state = {'will': None, 'subs': []}
+        clean = False
+        try:
+            while True:
+                op = (await reader.readexactly(1))[0]
+                n = 0
+                shift = 0
+                while True:
+                    b = (await reader.readexactly(1))[0]
+                    n |= (b & 0x7F) << shift
+                    shift += 7
+                    if not b & 0x80:
+                        break
+                body = await reader.readexactly(n) if n else b''
+                if self.stalled:
+                    continue
+                if op == 0xE0:
+                    clean = True
+                    break
+                await self._handle(op, body, writer, state)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._sessions.discard(writer)
+            if not clean and state['will']:
+                self._deliver(*state['will'])
+            writer.close()
+
+    async def _handle(self, op, body, writer, state):
+        kind = op & 0xF0
+        if kind == 0x10:  # CONNECT
+            flags = body[7]
+            pos = 10
+            pos += 2 + struct.unpack_from('!H', body, pos)[0]  # client id
+            if flags & 0x04:
+                tlen = struct.unpack_from('!H', body, pos)[0]
+                topic = body[pos + 2:pos + 2 + tlen].decode()
+                pos += 2 + tlen
+                mlen = struct.unpack_from('!H', body, pos)[0]
+                msg = body[pos + 2:pos + 2 + mlen]
+                state['will'] = (topic, bytes(msg), (flags >> 3) & 3, bool(flags & 0x20))
+            self.connects += 1
+            writer.write(b'\x20\x02\x00\x00')
+        elif kind == 0x30:  # PUBLISH
+            qos = (op >> 1) & 3
+            tlen = struct.unpack_from('!H', body, 0)[0]
+            topic = body[2:2 + tlen].decode()
+            pos = 2 + tlen
+            if qos:
+                pid = body[pos:pos + 2]
+                pos += 2
+            self._deliver(topic, bytes(body[pos:]), qos, bool(op & 1))
+            if qos == 1:
+                if self.drop_pubacks:
+                    self.drop_pubacks -= 1
+                elif self.puback_delay:
+                    asyncio.get_running_loop().call_later(self.puback_delay, self._puback, writer, pid)
+                else:
+                    self._puback(writer, pid)
+        elif kind == 0x80:  # SUBSCRIBE
+            pid = body[0:2]
+            pos = 2
+            granted = b''
+            while pos < len(body):
+                tlen = struct.unpack_from('!H', body, pos)[0]
+                pattern = body[pos + 2:pos + 2 + tlen].decode()
+                pos += 3 + tlen
+                state['subs'].append(pattern)
+                self._subscribers.append((pattern, writer))
+                granted += b'\x00'
+            writer.write(bytes([0x90, 2 + len(granted)]) + pid + granted)
+            for topic, payload in self.retained.items():
+                if any(topic_matches(p, topic) for p in state['subs']):
+                    writer.write(self._publish_packet(topic, payload, True))
+        elif kind == 0xC0:  # PINGREQ
+            self.pings += 1
+            writer.write(b'\xd0\x00')
+        await writer.drain()
+
+    def _deliver(self, topic, payload, qos, retain):
+        self.published.append((topic, payload, qos, retain))
+        if retain:
+            if payload:
+                self.retained[topic] = payload
+            else:
+                self.retained.pop(topic, None)
+        for pattern, writer in self._subscribers:
+            if writer in self._sessions and topic_matches(pattern, topic):
+                writer.write(self._publish_packet(topic, payload, False))
+
+    @staticmethod
+    def _publish_packet(topic, payload, retain):
+        body = struct.pack('!H', len(topic)) + topic.encode() + payload
+        hdr = bytearray([0x30 | retain])
+        n = len(body)
+        while True:
+            b = n & 0x7F
+            n >>= 7
+            hdr.append(b | (0x80 if n else 0))
+            if not n:
+                break
+        return bytes(hdr) + body
+
+
+async def _max_stall(coro):
+    """Run `coro` while a 10 ms ticker runs; return (result, longest ticker gap in s)."""
+    gaps = [0.0]
+
+    async def ticker():
+        last = time.monotonic()
+        while True:
+            await asyncio.sleep(0.01)
+            now = time.monotonic()
+            gaps[0] = max(gaps[0], now - last)
+            last = now
+
+    task = asyncio.create_task(ticker())
+    try:
+        result = await coro
+    finally:
+        task.cancel()
+    return result, gaps[0]
+
+
+async def _drain(mqtt, timeout=2.0):
+    """Wait until the publisher's queue is empty."""
+    deadline = time.monotonic() + timeout
+    while mqtt.get_stats()["queue_depth"] and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.05)
+
+
+async def smoke():
+    from umqtt.AsyncMqttPublisher import AsyncMqttPublisher
+    from umqtt.offline_log import OfflineLog
+    from umqtt.SensorPublisher import SensorPublisher
+
+    failures = 0
+
+    def check(name, ok):
+        nonlocal failures
+        print(("PASS " if ok else "FAIL ") + name)
+        failures += not ok
+
+    broker = await StandInBroker().start()
+    mqtt = AsyncMqttPublisher(broker.config(), retry_delay=0.1)
+    mqtt.set_priority("test/presence", 2)
+    mqtt.start()
+
+    for i in range(10):
+        await mqtt.publish(f"test/qos0/{i}", {"n": i})
+    await mqtt.publish("test/qos1", "reliable", qos=1)
+    await _drain(mqtt)
+    check("10 QoS 0 + 1 QoS 1 messages delivered",
+          len([p for p in broker.published if p[0].startswith("test/")]) == 11)
+
+    broker.stalled = True
+    await mqtt.publish("test/stalled", "lost", qos=1)
+    ok, gap = await _max_stall(asyncio.sleep(1.5))
+    check(f"stalled broker: send failed ({mqtt.failed} failures), loop stall {gap * 1000:.0f} ms",
+          mqtt.failed >= 1 and gap < 0.1)
+
+    sent = len(broker.published)
+    for lux in range(5):
+        await mqtt.publish("test/brightness", {"brightness": lux})
+    await mqtt.publish("test/presence", {"is_presence": "on"})
+    broker.stalled = False
+    broker.drop_connections()
+    await _drain(mqtt)
+    topics = [p[0] for p in broker.published[sent:]]
+    check(f"coalesced brightness ({mqtt.coalesced} replaced), presence sent first: {topics}",
+          topics.count("test/brightness") == 1 and topics.index("test/presence") < topics.index("test/brightness"))
+    check(f"reconnect after dropped connection (connects={broker.connects})", broker.connects >= 2)
+
+    # Template payloads are borrowed, not copied: re-rendering during a send must not corrupt it
+    climate = SensorPublisher(mqtt, "test/template", '{"temperature":%d,"humidity":%.1f}')
+    for i in range(50):
+        await climate.publish(i, 100 - i)
+        if i % 7 == 0:
+            await asyncio.sleep(0)
+    await _drain(mqtt)
+    got = [json.loads(p[1]) for p in broker.published if p[0] == "test/template"]
+    check(f"template payloads intact ({len(got)} sent, last {got[-1] if got else None})",
+          got and all(g["temperature"] + g["humidity"] == 100 for g in got) and got[-1]["temperature"] == 49)
+
+    # Broker down: readings go to the flash log and are replayed after reconnect
+    port = broker.port
+    await broker.stop()
+    await asyncio.sleep(0.05)
+    path = os.path.join(tempfile.mkdtemp(), 'offline.log')
+    mqtt.offline_log = OfflineLog(path, slots=8, batch_records=4)
+    mqtt.replay_batch = 3
+    mqtt.replay_interval = 0.05
+    for i in range(10):
+        await mqtt.publish("test/climate", {"temperature": 20 + i})
+    broker = await StandInBroker(port=port).start()
+    await asyncio.sleep(1.0)
+    backlog = [p for p in broker.published if p[0] == "test/climate/backlog"]
+    live = [p for p in broker.published if p[0] == "test/climate"]
+    stats = mqtt.offline_log.get_stats()
+    check(f"offline backlog replayed: {len(backlog)} of 10 (8 slots), live sent {len(live)}, log {stats}",
+          len(backlog) == 8 and len(live) == 1 and b'"temperature": 29' in backlog[-1][1]
+          and stats["backlog"] == 0 and stats["dropped"] == 2)
+    print(mqtt.get_stats())
+    await mqtt.disconnect()
+
+    # QoS 1 in-flight window: 20 messages with a 50 ms PUBACK round trip
+    broker.puback_delay = 0.05
+    reliable = AsyncMqttPublisher(broker.config(client_id=b'standin-qos1', inflight=4), retry_delay=0.1)
+    reliable.start()
+    window = None
+    start = time.monotonic()
+    for i in range(20):
+        await reliable.publish(f"test/reliable/{i}", {"n": i}, qos=1)
+    while time.monotonic() - start < 3:
+        window = reliable.client.inflight
+        if window is not None and window.acked == 20:
+            break
+        await asyncio.sleep(0.01)
+    elapsed = time.monotonic() - start
+    check(f"QoS 1 window of 4: 20 acked in {elapsed * 1000:.0f} ms (20 round trips = 1000 ms)",
+          window is not None and window.acked == 20 and elapsed < 0.6)
+
+    # Unacknowledged messages are re-sent after a reconnect
+    broker.puback_delay = 0
+    broker.drop_pubacks = 2
+    await reliable.publish("test/reliable/a", "a", qos=1)
+    await reliable.publish("test/reliable/b", "b", qos=1)
+    await _drain(reliable)
+    broker.drop_connections()
+    await reliable.publish("test/reliable/c", "c", qos=1)
+    await _drain(reliable)
+    resent = [p[0] for p in broker.published if p[0] in ("test/reliable/a", "test/reliable/b")]
+    stats = reliable.get_stats()["qos1"]
+    check(f"unacked QoS 1 messages re-sent after reconnect: {stats}",
+          len(resent) == 4 and stats["retransmitted"] == 2 and stats["inflight"] == 0)
+
+    await reliable.disconnect()
+
+    # Keepalive: pings on schedule, a missing PINGRESP drops the link, backoff reconnect
+    lively = AsyncMqttPublisher(broker.config(client_id=b'standin-ka', keepalive=1), retry_delay=0.1)
+    lively.start()
+    await asyncio.sleep(1.2)
+    pings = broker.pings
+    broker.stalled = True
+    await asyncio.sleep(2.0)
+    broker.stalled = False
+    broker.drop_connections()
+    await asyncio.sleep(0.6)
+    stats = lively.get_stats()["connection"]
+    check(f"keepalive pings ({pings} before stall) and reconnect after missing PINGRESP: {stats}",
+          pings >= 2 and stats["ping_timeouts"] >= 1 and stats["reconnects"] >= 1 and lively.connected)
+
+    await lively.disconnect()
+    await broker.stop()
+    return failures
+
+
+if __name__ == '__main__':
+    sys.exit(1 if asyncio.run(smoke()) else 0)
@@ -0,0 +1,139 @@
+"""Measure umqtt.simple packet encode/decode rate over a loopback socket.
+
+    python3 tools/mqtt_simple_bench.py [--packets N] [--payload BYTES] [--topic TOPIC]
+
+Encoding times publish() into one end of a socket pair while a thread drains
+the other end; decoding times wait_msg() on PUBLISH packets written by a
+thread. Socket write()/read() calls per packet are counted as well.
+"""
+import argparse
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+
+from umqtt.simple import MQTTClient
+
+
+class HostSocket:
+    """Gives a CPython socket the MicroPython stream API used by umqtt.simple."""
+    def __init__(self, sock):
+        self.sock = sock
+        self.writes = 0
+        self.reads = 0
+
+    def write(self, buf, n=None):
+        self.writes += 1
+        self.sock.sendall(memoryview(buf)[:n] if n is not None else buf)
+        return len(buf) if n is None else n
+
+    def read(self, n):
+        self.reads += 1
+        out = bytearray()
+        while len(out) < n:
+            try:
+                chunk = self.sock.recv(n - len(out))
+            except BlockingIOError:
+                if not out:
+                    return None
+                continue
+            if not chunk:
+                break
+            out += chunk
+        return bytes(out)
+
+    def readinto(self, buf):
+        self.reads += 1
+        try:
+            return self.sock.recv_into(buf)
+        except BlockingIOError:
+            return None
+
+    def setblocking(self, flag):
+        self.sock.setblocking(flag)
+
+    def settimeout(self, timeout):
+        self.sock.settimeout(timeout)
+
+    def close(self):
+        self.sock.close()
+
+
+def publish_packet(topic, payload):
+    body = struct.pack("!H", len(topic)) + topic + payload
+    sz = len(body)
+    hdr = bytearray(b"\x30")
+    while sz > 0x7F:
+        hdr.append((sz & 0x7F) | 0x80)
+        sz >>= 7
+    hdr.append(sz)
+    return bytes(hdr) + body
+
+
+def bench_encode(packets, topic, payload):
+    a, b = socket.socketpair()
+    client = MQTTClient(b"bench", "localhost")
+    client.sock = HostSocket(a)
+
+    def drain():
+        while b.recv(65536):
+            pass
+
+    reader = threading.Thread(target=drain, daemon=True)
+    reader.start()
+    start = time.perf_counter()
+    for _ in range(packets):
+        client.publish(topic, payload)
+    elapsed = time.perf_counter() - start
+    a.close()
+    reader.join()
+    b.close()
+    return elapsed, client.sock.writes
+
+
+def bench_decode(packets, topic, payload):
+    a, b = socket.socketpair()
+    client = MQTTClient(b"bench", "localhost")
+    client.sock = HostSocket(a)
+    received = 0
+
+    def cb(t, msg):
+        nonlocal received
+        received += 1
+
+    client.set_callback(cb)
+    stream = publish_packet(topic, payload) * packets
+    writer = threading.Thread(target=b.sendall, args=(stream,), daemon=True)
+    writer.start()
+    start = time.perf_counter()
+    for _ in range(packets):
+        client.wait_msg()
+    elapsed = time.perf_counter() - start
+    writer.join()
+    a.close()
+    b.close()
+    assert received == packets, received
+    return elapsed, client.sock.reads
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--packets', type=int, default=20000)
+    parser.add_argument('--payload', type=int, default=40, help='payload size in bytes')
+    parser.add_argument('--topic', default='pico/sensor/temperaturenhumidity')
+    args = parser.parse_args()
+
+    topic = args.topic.encode()
+    payload = b'x' * args.payload
+    elapsed, writes = bench_encode(args.packets, topic, payload)
+    print(f"encode: {args.packets / elapsed:.0f} packets/s, {writes / args.packets:.2f} writes/packet")
+    elapsed, reads = bench_decode(args.packets, topic, payload)
+    print(f"decode: {args.packets / elapsed:.0f} packets/s, {reads / args.packets:.2f} reads/packet")
+
+
+if __name__ == '__main__':
+    main()
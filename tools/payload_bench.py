@@ -0,0 +1,83 @@
+"""Compare payload encodings for the DHT11 and LD2410 state topics.
+
+    python3 tools/payload_bench.py [--iterations N] [--radars N]
+
+Times json.dumps() of the payload dict, PayloadTemplate rendering, the
+StructCodec and CBOR codecs, and prints the bytes each puts on the wire.
+Host timings only show relative cost; the RP2040 is much slower.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'lib'))
+sys.path.insert(0, ROOT)
+
+from umqtt.codec import CBOR
+from umqtt.template import PayloadTemplate
+from modules.payload_schemas import climate_codec, mmwave_state_codec
+
+STATUS = ('No target detected', 'Stationary target detected', 'Moving target detected', 'Both stationary and moving')
+RADAR_TEMPLATE = '"{}":{{"current_status":"%s","moving_dist":%d,"moving_energy":%d,"stat_dist":%d,"detect_dist":%d}}'
+
+
+def timed(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        out = fn()
+    return (time.perf_counter() - start) / iterations * 1e6, len(out)
+
+
+def climate_cases():
+    reading = {"temperature": 23, "humidity": 41}
+    template = PayloadTemplate('{"temperature":%d,"humidity":%d}')
+    codec = climate_codec()
+    values = (23, 41)
+    return [
+        ("json.dumps", lambda: json.dumps(reading).encode()),
+        ("PayloadTemplate", lambda: template.render(values)),
+        ("StructCodec", lambda: codec.render(values)),
+        ("CBOR", lambda: CBOR.encode(reading)),
+    ]
+
+
+def mmwave_cases(radar_count):
+    names = ["radar%d" % (i + 1) for i in range(radar_count)]
+    radars = {name: {"current_status": STATUS[2], "moving_dist": 120, "moving_energy": 64,
+                     "stat_dist": 95, "detect_dist": 150} for name in names}
+    state = {"is_presence": "on", "attributes": {"current_status": STATUS[2], "radars": radars}}
+    template = PayloadTemplate('{"is_presence":"%s","attributes":{"current_status":"%s","radars":{'
+                               + ','.join(RADAR_TEMPLATE.format(name) for name in names) + '}}}')
+    text_values = [b'on', STATUS[2].encode()] + [b'Moving target detected', 120, 64, 95, 150] * radar_count
+    codec = mmwave_state_codec(names)
+    binary_values = [1, 2] + [2, 120, 64, 95, 150] * radar_count
+    compact = {"is_presence": 1, "state": 2,
+               "radars": {name: [2, 120, 64, 95, 150] for name in names}}
+    return [
+        ("json.dumps", lambda: json.dumps(state).encode()),
+        ("PayloadTemplate", lambda: template.render(text_values)),
+        ("StructCodec", lambda: codec.render(binary_values)),
+        ("CBOR (same dict)", lambda: CBOR.encode(state)),
+        ("CBOR (numeric)", lambda: CBOR.encode(compact)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20000)
+    parser.add_argument('--radars', type=int, default=1)
+    args = parser.parse_args()
+
+    for title, cases in (("DHT11 climate", climate_cases()),
+                         ("LD2410 state, %d radar(s)" % args.radars, mmwave_cases(args.radars))):
+        print(title)
+        for name, fn in cases:
+            us, size = timed(fn, args.iterations)
+            print(f"  {name:18} {us:6.2f} us  {size:4d} bytes")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""Decode MQTT payloads from this device on the host.
+
+    python3 tools/payload_decoder.py HEX [--radars radar1,radar2] [--backlog]
+
+JSON, CBOR and the StructCodec schemas in modules/payload_schemas.py are
+told apart by their first byte. --backlog strips the 4-byte timestamp that
+offline-log replays put in front of binary readings.
+"""
+import argparse
+import binascii
+import os
+import struct
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'lib'))
+sys.path.insert(0, ROOT)
+
+from umqtt.codec import JSON, CBOR
+from modules.payload_schemas import CLIMATE_SCHEMA, MMWAVE_STATE_SCHEMA, climate_codec, mmwave_state_codec
+
+
+def decode(data, radars=("radar1",)):
+    """Return the payload as a dict (or list/str for non-dict payloads)."""
+    first = data[0]
+    if first == ord('{') or first == ord('['):
+        return JSON.decode(data)
+    if 0x80 <= first <= 0xBF:  # CBOR array or map
+        return CBOR.decode(data)
+    if first == CLIMATE_SCHEMA:
+        return climate_codec().decode(data)
+    if first == MMWAVE_STATE_SCHEMA:
+        return mmwave_state_codec(radars).decode(data)
+    raise ValueError("Unknown payload format 0x%02x" % first)
+
+
+def decode_backlog(data, radars=("radar1",)):
+    """Decode a binary `<topic>/backlog` message into (timestamp, payload)."""
+    return struct.unpack_from('<I', data, 0)[0], decode(data[4:], radars)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('payload', help='payload as hex')
+    parser.add_argument('--radars', default='radar1', help='comma-separated LD2410 names, in MMWAVE_RADARS order')
+    parser.add_argument('--backlog', action='store_true', help='payload comes from <topic>/backlog')
+    args = parser.parse_args()
+
+    data = binascii.unhexlify(args.payload.replace(' ', ''))
+    radars = args.radars.split(',')
+    print(decode_backlog(data, radars) if args.backlog else decode(data, radars))
+
+
+if __name__ == '__main__':
+    main()
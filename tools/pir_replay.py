@@ -0,0 +1,73 @@
+"""Drive the interrupt-driven PIR driver with a FakePin on Linux.
+
+    python3 tools/pir_replay.py
+
+Replays motion, contact bounce and re-triggers inside the hold time, and
+checks that each motion start is reported once, within the debounce time of
+its edge, and that motion ends only after the hold time.
+"""
+import asyncio
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'lib'))
+sys.path.insert(0, ROOT)
+
+from fake_pin import FakePin
+
+
+async def smoke():
+    from modules.pir_motion_sensor import PIRSensor
+
+    failures = 0
+
+    def check(name, ok):
+        nonlocal failures
+        print(("PASS " if ok else "FAIL ") + name)
+        failures += not ok
+
+    pin = FakePin()
+    changes = []
+    started = time.monotonic()
+    sensor = PIRSensor(pin=pin, debounce_ms=20, hold_s=0.3,
+                       on_change=lambda motion: changes.append((motion, time.monotonic() - started)))
+    task = asyncio.create_task(sensor.activate_pir())
+    await asyncio.sleep(0.05)
+    check("no wake-ups while the pin is steady", sensor.edges == 0 and not changes)
+
+    edge = time.monotonic() - started
+    pin.set(1)
+    # Contact bounce right after the edge
+    for level in (0, 1, 0, 1):
+        await asyncio.sleep(0.002)
+        pin.set(level)
+    await asyncio.sleep(0.1)
+    check(f"motion reported once, {(changes[0][1] - edge) * 1000:.0f} ms after the edge"
+          if changes else "motion reported",
+          len(changes) == 1 and changes[0][0] is True and changes[0][1] - edge < 0.06)
+
+    # Output drops and comes back inside the hold time: still one motion period
+    pin.set(0)
+    await asyncio.sleep(0.15)
+    pin.set(1)
+    await asyncio.sleep(0.1)
+    check("re-trigger inside the hold time keeps motion on", len(changes) == 1)
+
+    fell = time.monotonic() - started
+    pin.set(0)
+    await asyncio.sleep(0.5)
+    ended = changes[1][1] - fell if len(changes) > 1 else 0
+    check(f"motion ended {ended * 1000:.0f} ms after the output fell (hold 300 ms)",
+          len(changes) == 2 and changes[1][0] is False and 0.28 < ended < 0.4)
+
+    sensor.deactivate_pir()
+    await asyncio.wait_for(task, 1)
+    check("deactivate releases the IRQ", pin.handler is None)
+    print(sensor.get_stats())
+    return failures
+
+
+if __name__ == '__main__':
+    sys.exit(1 if asyncio.run(smoke()) else 0)